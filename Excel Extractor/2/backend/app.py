@@ -1,25 +1,51 @@
 # Import necessary modules from Flask for building the web application
 from flask import (
-    Flask, request, jsonify, send_file, 
+    Flask, Request, request, jsonify, send_file, 
     send_from_directory, Response
 )
 
 # Import standard Python libraries for file handling, logging, and data processing
+import io
 import os
 import json
-import pandas as pd
 import logging
 import time
-from pathlib import Path
 
 # Import custom modules for Excel parsing and AI-based description processing
 from src.excel_parser.excel_parser import ExcelParser
-from src.ai.ollama_handler import parse_description_with_ollama, create_empty_fields 
+from src.excel_parser.preview import preview_sheet
+from src.excel_parser.excel_writer import (
+    render_records, OrderedRowWriter, OUTPUT_COLUMNS, XLSX_MIMETYPE, CSV_MIMETYPE
+)
+from src.ai.inference_backend import get_backend
+from src.ai.model_manager import ModelManager
+from src.ai.ollama_handler import GENERATION_BUDGET, PREFIX_PROMPTS, TARGET_COLUMNS, warmup_options
+from src.ai.cancellation import ExtractionCancelled
+from src.jobs.job import Job
+from src.jobs.admission import AdmissionController, AdmissionRejected
+from src.jobs.extraction import (
+    RowTask, skip_empty, preprocess_row, lookup_cached, extract_with_model, extract_coalesced, finish_record,
+    similarity_order, result_cache, in_flight, near_duplicates, NEAR_DUPLICATE_THRESHOLD
+)
+from src.jobs.job_metrics import generation_report, prompt_layout_report
+from src.jobs.reprocess import load_previous_output, plan_reprocessing
+from src.jobs.estimator import plan_rows, project, stratified_sample, time_sample
+from src.matching.category_matcher import get_category_matcher
+from src.jobs.scheduler import RowScheduler
+from src.pipeline.pipeline import Pipeline, Stage
+from src.storage.product_master import ProductMaster, normalize_key
+from src.storage.upload_store import UploadStore
+from src.storage.chunked_upload import ChunkedUploads, UploadRejected
+from src.storage.storage_manager import StorageManager
 
 # Import additional libraries for unique ID generation, CORS support, and threading
 import uuid
+import pandas as pd
+from concurrent.futures import CancelledError
+from functools import partial
+from threading import Lock
 from flask_cors import CORS
-from threading import Event
+from typing import Dict, Optional
 
 # Configure logging to track application events and debug issues
 logging.basicConfig(
@@ -29,27 +55,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class InMemoryRequest(Request):
+    """Keeps uploaded files in memory instead of spooling large ones to a temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 # Initialize the Flask application and enable CORS for cross-origin requests
 app = Flask(__name__, static_folder='static', static_url_path='')
+app.request_class = InMemoryRequest
 CORS(app)
 
 # Generate a random secret key for session management
 app.secret_key = os.urandom(24)
 
 # Define global variables to manage application state
-stop_processing = Event()  # Event to signal when processing should stop
-current_output_file = None  # Path to the current output file being processed
-progress_data = {"current": 0, "total": 0}  # Track progress of processing tasks
+jobs = {}  # All known jobs by job ID (the upload ID of the processed file)
+jobs_lock = Lock()  # Held while checking for and registering the job of an upload
+current_job: Optional[Job] = None  # Most recently started job
 
 # Configure application settings, including upload folder and file size limits
 app.config.update({
-    'UPLOAD_FOLDER': 'temp/',  # Temporary folder for uploaded files
-    'MAX_CONTENT_LENGTH': 50 * 1024 * 1024,  # Maximum file size of 50 MB
-    'OLLAMA_MODEL': 'deepseek-r1:7b'  # Default AI model for processing descriptions
+    'MAX_CONTENT_LENGTH': 50 * 1024 * 1024,  # Maximum request size of 50 MB, a single upload or one chunk
+    'UPLOAD_CHUNK_BYTES': 8 * 1024 * 1024,  # Chunk size of resumable uploads
+    'MAX_UPLOAD_BYTES': 500 * 1024 * 1024,  # Largest workbook accepted as a resumable upload
+    'UPLOAD_SESSION_IDLE_SECONDS': 60 * 60,  # Resumable uploads with no chunk for this long are dropped
+    'UPLOAD_TTL_SECONDS': 60 * 60,  # Uploads that are not processed within this long are dropped
+    'STORAGE_QUOTA_BYTES': 2 * 1024 * 1024 * 1024,  # Memory for uploads and results before the least recently used go
+    'STORAGE_SWEEP_SECONDS': 60,  # How often expired uploads and results are released
+    'PREVIEW_MAX_ROWS': 100,  # Most rows a sheet preview returns
+    'DRY_RUN_SAMPLE_ROWS': 20,  # Rows a dry run of /api/process extracts to time the model
+    'COST_PER_1K_TOKENS': 0.0,  # Price dry runs put on projected tokens, 0 for local models
+    'OLLAMA_MODEL': 'deepseek-r1:7b',  # Default AI model for processing descriptions
+    'STOP_TIMEOUT_SECONDS': 5,  # Maximum time /api/stop waits for the partial output
+    'JOB_RETENTION_SECONDS': 15 * 60,  # How long finished jobs stay available for snapshots after their last download
+    'ROW_STREAM_HEARTBEAT_SECONDS': 15,  # Idle interval before the row stream sends a heartbeat
+    'MAX_ACTIVE_ROWS': 20000,  # Global budget of rows across running jobs
+    'MAX_JOBS_PER_USER': 2,  # Running plus queued jobs allowed per user
+    'MAX_QUEUED_JOBS': 10,  # Jobs allowed to wait for capacity before new ones get a 429
+    'RETRY_AFTER_SECONDS': 60,  # Retry-After sent with a 429
+    'WORKERS_PER_HOST': None,  # Rows sent to each inference host at the same time across all jobs, None for the backend's batch size
+    'SMALL_JOBS_FIRST': True,  # Let small jobs run ahead of large ones
+    'SMALL_JOB_ROWS': 100,  # Jobs with at most this many rows count as small
+    'MODEL_JOB_KEEP_ALIVE': '60m',  # keep_alive sent with every row, refreshed for as long as a job runs
+    'MODEL_IDLE_UNLOAD_SECONDS': 600,  # Unload a model once no job has used it for this long
+    'TIERED_EXTRACTION': False,  # Try FAST_MODEL first and escalate rows that fail validation
+    'FAST_MODEL': 'mistral',  # Small model for the first tier, the default of version 1
+    'SPARSE_SCHEMAS': False,  # Ask only for the fields of each row's product group
+    'PREPROCESS_DESCRIPTIONS': True,  # Fix characters and strip boilerplate from descriptions before they go into prompts
+    'GROUP_SIMILAR_ROWS': False,  # Dispatch rows with similar prompts one after another for prefix cache reuse
+    # Known parts by vendor and part number, reused without the model; opened on first use
+    'PRODUCT_MASTER_DB': os.getenv(
+        'PRODUCT_MASTER_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'product_master.db')
+    ),
+    # Workers per extraction stage; the llm stage defaults to two per scheduler worker
+    'PIPELINE_STAGE_WORKERS': {'rules': 1, 'preprocess': 1, 'cache': 1, 'llm': None, 'normalize': 1, 'writer': 1},
+    'PIPELINE_QUEUE_SIZE': 32  # Rows allowed to wait between two stages
 })
 
-# Ensure the upload folder exists by creating it if necessary
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Admission control shared by every /api/process request
+admission = AdmissionController(
+    max_active_rows=app.config['MAX_ACTIVE_ROWS'],
+    max_jobs_per_user=app.config['MAX_JOBS_PER_USER'],
+    max_queued_jobs=app.config['MAX_QUEUED_JOBS'],
+    retry_after=app.config['RETRY_AFTER_SECONDS']
+)
+
+# Worker pool shared by all jobs, interleaving rows with weighted fair queuing
+# Hosts come from OLLAMA_HOSTS (or OPENAI_BASE_URLS), the pool grows with the number of hosts
+scheduler = RowScheduler(
+    num_workers=(app.config['WORKERS_PER_HOST'] or get_backend().batch_size) * len(get_backend().host_pool.hosts),
+    small_jobs_first=app.config['SMALL_JOBS_FIRST'],
+    small_job_rows=app.config['SMALL_JOB_ROWS']
+)
+
+# Preloads models for admitted jobs and unloads them once the service is idle
+model_manager = ModelManager(
+    get_backend(),
+    job_keep_alive=app.config['MODEL_JOB_KEEP_ALIVE'],
+    idle_unload_seconds=app.config['MODEL_IDLE_UNLOAD_SECONDS']
+)
+
+# Last extraction and approved fields of every part seen before
+product_master = ProductMaster(app.config['PRODUCT_MASTER_DB'], TARGET_COLUMNS)
+
+# Uploaded workbooks by upload ID, kept in memory until their job is done
+upload_store = UploadStore()
+
+# Resumable uploads still receiving chunks, handed to upload_store once complete
+chunked_uploads = ChunkedUploads(
+    chunk_size=app.config['UPLOAD_CHUNK_BYTES'],
+    max_upload_bytes=app.config['MAX_UPLOAD_BYTES']
+)
+
+# Uploads, upload sessions and finished results by job, released on TTL or when over the quota
+storage = StorageManager(
+    quota_bytes=app.config['STORAGE_QUOTA_BYTES'],
+    sweep_interval=app.config['STORAGE_SWEEP_SECONDS']
+)
 
 # Serve the React application from the static folder
 @app.route('/')
@@ -59,36 +162,29 @@ def serve():
 # Endpoint to stop the processing of data
 @app.route('/api/stop', methods=['POST'])
 def stop_processing_route():
-    global stop_processing, current_output_file, progress_data
     try:
         logger.info("Stop request received")
-        stop_processing.set()
+        job = find_job(request_job_id())
+        if job is None:
+            return jsonify({'error': 'No job running', 'success': False}), 404
+        job.cancel()
         
-        # Get current progress for the response
-        current_progress = progress_data.copy()
-        
-        # Wait for the file to be ready
-        wait_time = 0
-        max_wait = 10  # Maximum 10 seconds wait
-        while wait_time < max_wait:
-            if current_output_file and current_output_file.exists():
-                logger.info(f"File ready at: {current_output_file}")
-                return jsonify({
-                    'message': 'Processing stopped',
-                    'success': True,
-                    'filePath': str(current_output_file),
-                    'progress': current_progress
-                })
-            time.sleep(1)
-            wait_time += 1
-            logger.info(f"Waiting for file... ({wait_time}s)")
+        # Wait a bounded time for the worker to flush the partial output
+        if job.done_event.wait(app.config['STOP_TIMEOUT_SECONDS']):
+            logger.info(f"Job {job.job_id} stopped with {job.completed_rows} rows")
+            return jsonify({
+                'message': 'Processing stopped',
+                'success': True,
+                'filePath': job.output_name,
+                'progress': job.progress.copy()
+            })
         
         # If we get here, the file wasn't ready
         logger.error("Timeout waiting for file")
         return jsonify({
             'message': 'Processing stopped but file not ready',
             'success': True,  # Still return success as processing was stopped
-            'progress': current_progress
+            'progress': job.progress.copy()
         })
             
     except Exception as e:
@@ -98,20 +194,23 @@ def stop_processing_route():
 # Endpoint to download the processed file
 @app.route('/api/download', methods=['POST'])
 def download():
-    global current_output_file
     try:
-        if not current_output_file:
-            logger.error("No output file path set")
+        job = find_job(request_job_id())
+        if not job:
+            logger.error("No job to download")
             return jsonify({'error': 'No file path available'}), 404
-            
-        if not current_output_file.exists():
-            logger.error(f"File not found at: {current_output_file}")
+
+        if not job.is_finished:
+            logger.error(f"Output of job {job.job_id} is not ready")
             return jsonify({'error': 'File not found'}), 404
-            
-        logger.info(f"Sending file: {current_output_file}")
+
+        # Outputs are never written to disk, render them from the job's rows
+        storage.touch('result', job.job_id)
+        logger.info(f"Rendering output for job {job.job_id} from {job.completed_rows} rows")
+        records = sorted(job.snapshot(), key=lambda r: r.get('excel_row') or 0)
         return send_file(
-            current_output_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            render_records(records),
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
             download_name='processed_results.xlsx'
         )
@@ -119,6 +218,61 @@ def download():
         logger.error(f"Download error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Endpoint to download the rows completed so far without stopping the job
+@app.route('/api/jobs/<job_id>/snapshot', methods=['GET'])
+def snapshot(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    file_format = request.args.get('format', 'xlsx').lower()
+    if file_format not in ('xlsx', 'csv'):
+        return jsonify({'error': 'Format must be xlsx or csv'}), 400
+
+    try:
+        # Copy the completed rows and render outside the job lock
+        storage.touch('result', job_id)
+        records = sorted(job.snapshot(), key=lambda r: r.get('excel_row') or 0)
+        logger.info(f"Snapshot of job {job_id}: {len(records)} rows as {file_format}")
+        return send_file(
+            render_records(records, file_format),
+            mimetype=CSV_MIMETYPE if file_format == 'csv' else XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=f'partial_results.{file_format}'
+        )
+    except Exception as e:
+        logger.error(f"Snapshot error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Endpoint to stream each completed row as NDJSON, resumable from an offset
+@app.route('/api/jobs/<job_id>/rows', methods=['GET'])
+def stream_rows(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'Offset must be an integer'}), 400
+
+    def generate(offset):
+        while True:
+            # Check before reading so rows added just before finishing are still sent
+            finished = job.is_finished
+            rows = job.rows_since(offset, timeout=app.config['ROW_STREAM_HEARTBEAT_SECONDS'])
+            for row in rows:
+                yield json.dumps({'event': 'row', 'offset': offset, 'row': row}) + "\n"
+                offset += 1
+            if finished and not rows:
+                yield json.dumps({'event': 'end', 'offset': offset, 'status': job.status}) + "\n"
+                return
+            if not rows:
+                # Keep idle connections alive while a slow row is generating
+                yield json.dumps({'event': 'heartbeat', 'offset': offset}) + "\n"
+
+    return Response(generate(offset), mimetype='application/x-ndjson')
+
 # Serve static files from the static folder
 @app.route('/<path:path>')
 def static_files(path):
@@ -127,12 +281,61 @@ def static_files(path):
 # Endpoint to provide real-time progress updates
 @app.route('/api/progress')
 def progress():
+    job_id = request.args.get('job_id')
+
     def generate():
         while True:
+            job = find_job(job_id)
+            progress_data = job.progress if job else {"current": 0, "total": 0}
             yield f"data: {json.dumps(progress_data)}\n\n"
             time.sleep(0.5)
     return Response(generate(), mimetype='text/event-stream')
 
+# Endpoint to expose service and per-job metrics such as wait time, cold starts and tokens per row
+@app.route('/api/metrics')
+def metrics():
+    return jsonify({
+        'admission': admission.stats(),
+        'scheduler': scheduler.stats(),
+        'hosts': get_backend().host_pool.stats(),
+        'generation': generation_report.summary(),
+        'prompt_layout': prompt_layout_report.summary(),
+        'cache': dict(result_cache.stats(), **in_flight.stats()),
+        'near_duplicates': near_duplicates.stats(),
+        'product_master': product_master.stats(),
+        'uploads': upload_store.stats(),
+        'chunked_uploads': chunked_uploads.stats(),
+        'storage': storage.usage(),
+        'jobs': {job_id: job.metrics.summary() for job_id, job in jobs.items() if job.metrics}
+    })
+
+# Endpoint to report memory held for uploads and results, by kind and by job
+@app.route('/api/storage')
+def storage_usage():
+    return jsonify(storage.usage())
+
+# Endpoint to report whether the service can take new work
+@app.route('/api/ready')
+def ready():
+    backend = get_backend()
+    host_status = {
+        url: backend.model_status(app.config['OLLAMA_MODEL'], url)
+        for url in backend.host_pool.urls
+    }
+    queue = admission.stats()
+    # Ready as long as at least one host can serve the model
+    is_ready = (
+        any(s['reachable'] and s['model_available'] for s in host_status.values())
+        and queue['queued_jobs'] < app.config['MAX_QUEUED_JOBS']
+    )
+    return jsonify({
+        'ready': is_ready,
+        'model': app.config['OLLAMA_MODEL'],
+        'backend': backend.name,
+        'hosts': host_status,
+        'queue': queue
+    }), 200 if is_ready else 503
+
 # Endpoint to handle file uploads
 @app.route('/api/upload', methods=['POST'])
 def upload():
@@ -144,13 +347,13 @@ def upload():
         return jsonify({'error': 'No selected file'}), 400
 
     if file and file.filename.endswith('.xlsx'):
-        # Generate unique ID for this upload
+        # Generate unique ID for this upload and keep its bytes in memory
         upload_id = str(uuid.uuid4())
-        temp_path = Path(app.config['UPLOAD_FOLDER']) / f"{upload_id}.xlsx"
-        file.save(temp_path)
+        upload = upload_store.put(upload_id, file.filename, file.read(), owner=request_user())
+        keep_upload(upload)
         
         # Get sheet names
-        sheet_names = ExcelParser.get_sheet_names(str(temp_path))
+        sheet_names = ExcelParser.get_sheet_names(upload.open())
         
         return jsonify({
             'upload_id': upload_id,
@@ -159,32 +362,164 @@ def upload():
 
     return jsonify({'error': 'Invalid file type'}), 400
 
+# Endpoint to start a resumable upload; content the same user already uploaded is not sent again
+@app.route('/api/uploads', methods=['POST'])
+def start_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '')
+    sha256 = data.get('sha256')
+    if not filename.endswith('.xlsx'):
+        return jsonify({'error': 'Invalid file type'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Missing file size'}), 400
+
+    upload_id = str(uuid.uuid4())
+    if sha256:
+        upload = upload_store.link(upload_id, filename, sha256, request_user())
+        if upload is not None and upload.size == size:
+            keep_upload(upload)
+            return jsonify({
+                'upload_id': upload_id,
+                'complete': True,
+                'deduplicated': True,
+                'sheet_names': ExcelParser.get_sheet_names(upload.open())
+            })
+        if upload is not None:
+            upload_store.remove(upload_id)
+
+    try:
+        session = chunked_uploads.start(upload_id, filename, size, sha256)
+    except UploadRejected as e:
+        return jsonify({'error': e.reason}), e.status
+    storage.track('upload_session', upload_id, 0, partial(chunked_uploads.discard, upload_id),
+                  job_id=upload_id, ttl=app.config['UPLOAD_SESSION_IDLE_SECONDS'])
+    return jsonify(session.status())
+
+# Endpoint to report how much of a resumable upload has arrived
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    session = chunked_uploads.get(upload_id)
+    if session is not None:
+        return jsonify(session.status())
+    upload = upload_store.get(upload_id)
+    if upload is not None:
+        return jsonify({'upload_id': upload_id, 'size': upload.size, 'complete': True})
+    return jsonify({'error': 'Unknown upload'}), 404
+
+# Endpoint to receive one chunk of a resumable upload, checked against X-Chunk-SHA256 when sent
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    try:
+        session = chunked_uploads.write_chunk(
+            upload_id, index, request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+    except UploadRejected as e:
+        session = chunked_uploads.get(upload_id)
+        return jsonify({'error': e.reason, **(session.status() if session else {})}), e.status
+    storage.resize('upload_session', upload_id, len(session.buffer))
+    return jsonify(session.status())
+
+# Endpoint to assemble a fully received upload and read its sheet names
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    try:
+        session, data, fingerprint = chunked_uploads.finish(upload_id)
+    except UploadRejected as e:
+        session = chunked_uploads.get(upload_id)
+        return jsonify({'error': e.reason, **(session.status() if session else {})}), e.status
+
+    storage.forget('upload_session', upload_id)
+    upload = upload_store.put(upload_id, session.filename, data, fingerprint, owner=request_user())
+    keep_upload(upload)
+    return jsonify({
+        'upload_id': upload_id,
+        'complete': True,
+        'sheet_names': ExcelParser.get_sheet_names(upload.open())
+    })
+
+# Endpoint to preview the first rows of a sheet with suggested start cells
+@app.route('/api/uploads/<upload_id>/preview', methods=['GET'])
+def preview(upload_id):
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Invalid file session'}), 404
+    storage.touch('upload', upload_id)
+
+    try:
+        rows = min(max(int(request.args.get('rows', 20)), 1), app.config['PREVIEW_MAX_ROWS'])
+    except ValueError:
+        return jsonify({'error': 'Rows must be an integer'}), 400
+
+    try:
+        return jsonify(preview_sheet(upload.open(), request.args.get('sheet_name'), rows))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Preview of {upload_id} failed: {str(e)}")
+        return jsonify({'error': 'Could not read workbook'}), 400
+
+# Endpoint to import approved results from a corrected output workbook into the product master
+@app.route('/api/product-master/import', methods=['POST'])
+def import_product_master():
+    file = request.files.get('file')
+    if not file or not file.filename.endswith('.xlsx'):
+        return jsonify({'error': 'Invalid file type'}), 400
+
+    try:
+        df = pd.read_excel(file, dtype=str).fillna('')
+    except Exception as e:
+        logger.error(f"Could not read approved workbook: {str(e)}")
+        return jsonify({'error': 'Could not read workbook'}), 400
+
+    if 'part_number' not in df.columns:
+        return jsonify({'error': 'Missing columns: part_number'}), 400
+
+    imported = product_master.import_approved(df.to_dict('records'), approved_by=request_user())
+    return jsonify({'imported': imported, **product_master.stats()})
+
 # Endpoint to process the uploaded file
 @app.route('/api/process', methods=['POST'])
 def process():
-    global progress_data, stop_processing, current_output_file
-    temp_excel = None
-    output_excel = None
+    global current_job
+    upload_id = None
+    pinned_id = None
+    job = None
+    admitted = False
+    models_in_use = []
     try:
         logger.info("Starting process")
         
-        # Reset stop signal and progress
-        stop_processing.clear()
-        progress_data = {"current": 0, "total": 0}
-        
         upload_id = request.form['upload_id']
-        temp_excel = Path(app.config['UPLOAD_FOLDER']) / f"{upload_id}.xlsx"
+        # The upload ID is the job ID for the scheduler, admission and storage; one run per upload at a time
+        with jobs_lock:
+            active = jobs.get(upload_id)
+            if active is not None and not active.is_finished:
+                logger.warning(f"Upload {upload_id} already has a running job")
+                upload_id = None  # The upload belongs to the running job
+                return jsonify({'error': 'This file is already being processed'}), 409
+            # Register a fresh job so progress and snapshots can find it
+            job = Job(upload_id)
+            jobs[upload_id] = job
+        current_job = job
+        # The previous run's rows, e.g. of a dry run, are replaced by this one
+        storage.forget('result', upload_id)
+
+        # Keep the upload from expiring or being evicted while the job runs
+        storage.pin(upload_id)
+        pinned_id = upload_id
+        upload = upload_store.get(upload_id)
         
-        if not temp_excel.exists():
+        if upload is None:
             logger.error("File not found")
+            job.finish('failed')
             return jsonify({'error': 'Invalid file session'}), 400
 
-        # Create file paths
-        output_excel = temp_excel.with_name(f"{upload_id}_processed.xlsx")
-        current_output_file = output_excel
+        job.output_name = f"{upload_id}_processed.xlsx"
 
-        # Excel to JSON conversion
-        parser = ExcelParser(str(temp_excel))
+        # Excel to JSON conversion, straight from the upload's bytes
+        parser = ExcelParser(upload.open())
         
         if not parser.load_file(sheet_name=request.form['sheet_name']):
             logger.error("Invalid sheet name")
@@ -202,162 +537,321 @@ def process():
             return jsonify({'error': 'No data found in specified cells'}), 400
             
         total_rows = len(extracted_data)
-        progress_data["total"] = total_rows
-        logger.info(f"Processing {total_rows} rows")
-        
-        # Process data through AI with progress tracking
-        processed_data = []
-        for idx, record in enumerate(extracted_data, 1):
+        job.progress["total"] = total_rows
+
+        # Rows whose fields are already known, by excel_row: (fields, extra output columns)
+        known_rows = {}
+        pending_rows = extracted_data
+
+        # Re-running a processed sheet: carry over rows that are unchanged and extracted fine
+        previous_output = request.files.get('previous_output')
+        if previous_output:
             try:
-                if stop_processing.is_set():
-                    logger.info("Processing stopped by user")
-                    break
-                    
-                progress_data["current"] = idx
-                
-                description = record.get('description', '').strip()
-                
-                # Skip AI processing for empty or invalid descriptions
-                if description in ['???', '(blank)', '']:
-                    logger.info(f"Row {idx}/{total_rows} - Skipped (empty description)")
-                    new_record = {
-                        "part_number": record.get("part_number"),
-                        "description": description
-                    }
-                    new_record.update(create_empty_fields())
-                    processed_data.append(new_record)
-                    continue
-                
-                logger.info(f"Row {idx}/{total_rows} ({(idx/total_rows)*100:.1f}%)")
-                
-                # Get AI extraction for the description
-                extracted = parse_description_with_ollama(
-                    description,
-                    app.config.get('OLLAMA_MODEL', 'deepseek-r1:7b')
-                )
-                
-                # Create new record
-                new_record = {
-                    "part_number": record.get("part_number"),
-                    "description": description
-                }
-                new_record.update(extracted)
-                processed_data.append(new_record)
-                
+                previous_rows = load_previous_output(previous_output)
             except Exception as e:
-                logger.error(f"Error on row {idx}")
-                # Continue with empty fields rather than failing
-                new_record = {
-                    "part_number": record.get("part_number"),
-                    "description": record.get("description", "")
-                }
-                new_record.update(create_empty_fields())
-                processed_data.append(new_record)
-        
-        logger.info("Processing complete")
-        
-        # Convert processed data to Excel
-        df = pd.DataFrame(processed_data)
-        
-        # Define columns order
-        columns = [
-            'part_number',
-            'description',
-            'Vendor',
-            'Size',
-            'Length',
-            'Height',
-            'Flange Class',
-            'Pipe Class',
-            'Manufacturer',
-            'Connection Type 1',
-            'Connection Type 2',
-            'Product Type',
-            'Body Material',
-            'Trim Material',
-            'Seat/Elastomer material',
-            'NACE (Y/N)',
-            'Fireproof (Y/N)',
-            'API (Y/N)',
-            'ASME (Y/N)',
-            'Operation',
-            'Mfr Model Number',
-            'Vendor Material Number',
-            'Meter Type',
-            'Perforation Size',
-            'Orifice Diameter',
-            'Pump Type',
-            'Horsepower',
-            'RPM',
-            'Phase',
-            'Voltage',
-            'Hertz',
-            'Class 1 Division',
-            'NEMA',
-            'Specific Gravity',
-            'Pressure',
-            'Flow Rate',
-            'Temperature',
-            'Other'
+                logger.error(f"Could not read previous output: {str(e)}")
+                return jsonify({'error': 'Could not read previous output workbook'}), 400
+            carried, rerun = plan_reprocessing(extracted_data, previous_rows, get_category_matcher())
+            for record, fields in carried:
+                known_rows[record['excel_row']] = (fields, {'reprocess': 'carried'})
+            for _, reason in rerun:
+                job.metrics.increment(f"rerun: {reason}")
+            job.metrics.increment('carried_rows', len(carried))
+            pending_rows = [record for record, _ in rerun]
+            logger.info(f"{len(carried)}/{total_rows} rows carried over from the previous output")
+
+        # Parts already in the product master cost one lookup instead of a model call
+        known_parts = product_master.lookup_many(pending_rows)
+        unknown_rows = []
+        for record in pending_rows:
+            known = known_parts.get(
+                (normalize_key(record.get('vendor')), normalize_key(record.get('part_number')))
+            )
+            # An extraction only stands for the description it came from; approvals stand for the part
+            if not known or (known[0] == 'extracted' and
+                             ' '.join(known[2].split()) != ' '.join(record.get('description', '').split())):
+                unknown_rows.append(record)
+                continue
+            source, fields, _ = known
+            known_rows[record['excel_row']] = (fields, {'product_master': source})
+            job.metrics.increment(f'product_master_{source}')
+        if len(unknown_rows) < len(pending_rows):
+            logger.info(f"{len(pending_rows) - len(unknown_rows)}/{total_rows} rows found in the product master")
+        pending_rows = unknown_rows
+
+        # Per-job overrides of the extraction settings;
+        # generation_budget=0 runs a job with unbounded calls, for comparing tokens and latency
+        model_name = app.config.get('OLLAMA_MODEL', 'deepseek-r1:7b')
+        budgeted = form_flag('generation_budget', GENERATION_BUDGET)
+        fast_model = app.config['FAST_MODEL'] if form_flag('tiered', app.config['TIERED_EXTRACTION']) else None
+        sparse = form_flag('sparse', app.config['SPARSE_SCHEMAS'])
+        preprocess = form_flag('preprocess', app.config['PREPROCESS_DESCRIPTIONS'])
+        # prefix_prompts=0 puts the description back in the middle of the prompt, for comparing prompt_eval time
+        prefix_prompt = form_flag('prefix_prompts', PREFIX_PROMPTS)
+        group_similar = form_flag('group_similar', app.config['GROUP_SIMILAR_ROWS'])
+        job.metrics.set('generation_budget', budgeted)
+        job.metrics.set('fast_model', fast_model)
+        job.metrics.set('sparse_schemas', sparse)
+        job.metrics.set('preprocess', preprocess)
+        job.metrics.set('prefix_prompts', prefix_prompt)
+        job.metrics.set('group_similar', group_similar)
+
+        # Dry run: only a stratified sample of the rows that need the model is extracted
+        dry_run = form_flag('dry_run', False)
+        if dry_run:
+            plan = plan_rows(extracted_data, set(known_rows), model_name, fast_model, sparse, prefix_prompt, preprocess)
+            sample = stratified_sample(
+                plan, request.form.get('sample_rows', app.config['DRY_RUN_SAMPLE_ROWS'], type=int)
+            )
+            pending_rows = [task.record for task in sample]
+            job.metrics.set('dry_run', True)
+
+        # Wait for capacity, reporting the queue position through progress
+        user = request_user()
+        try:
+            admission.admit(
+                job.job_id, user, len(pending_rows),
+                cancel_token=job.cancel_token,
+                on_queued=lambda position: job.progress.update(queue_position=position)
+            )
+            admitted = True
+        except AdmissionRejected as e:
+            logger.warning(f"Job {job.job_id} rejected: {e.reason}")
+            job.finish('rejected')
+            upload_id = None  # Keep the upload so the client can retry
+            response = jsonify({'error': e.reason, 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        except ExtractionCancelled:
+            logger.info(f"Job {job.job_id} stopped while queued")
+        job.progress.pop('queue_position', None)
+
+        # Preload the models so the first rows do not absorb their load time
+        if admitted and pending_rows:
+            cold_start = 0.0
+            for name in ([fast_model] if fast_model else []) + [model_name]:
+                cold_start += model_manager.job_started(name, warmup_options(name, budgeted))
+                models_in_use.append(name)
+            job.metrics.set('cold_start_seconds', round(cold_start, 3))
+
+        logger.info(f"Processing {len(pending_rows)} rows")
+        if group_similar:
+            extracted_data = similarity_order(extracted_data, sparse, preprocess)
+
+        # Model calls go through the shared worker pool; rows of concurrent jobs are interleaved
+        scheduler.register_job(
+            job.job_id, len(pending_rows), priority=request.form.get('priority', 1.0, type=float)
+        )
+        try:
+            # Cancelling the job also drops its rows still waiting for a worker
+            job.cancel_token.register(lambda: scheduler.cancel_job(job.job_id))
+        except ExtractionCancelled:
+            pass
+
+        if dry_run:
+            upload_id = None  # Keep the upload for the real run
+            sampled = time_sample(
+                sample if admitted else [],
+                lambda task, row_metrics: extract_with_model(
+                    task, model_name,
+                    cancel_token=job.cancel_token,
+                    keep_alive=model_manager.job_keep_alive,
+                    metrics=row_metrics,
+                    budgeted=budgeted,
+                    fast_model=fast_model,
+                    sparse=sparse,
+                    prefix_prompt=prefix_prompt
+                ),
+                lambda fn: scheduler.submit(job.job_id, fn)
+            )
+            estimate = project(
+                plan, sampled,
+                workers=scheduler.num_workers,
+                cold_start_seconds=job.metrics.summary().get('cold_start_seconds', 0.0),
+                cost_per_1k_tokens=app.config['COST_PER_1K_TOKENS']
+            )
+            estimate.update({'dry_run': True, 'model': model_name, 'fast_model': fast_model})
+            job.metrics.set('estimate', estimate)
+            job.finish('estimated')
+            logger.info(f"Dry run of {total_rows} rows: about {estimate['projection']['minutes']} minutes")
+            return jsonify(estimate)
+
+        def apply_rules(task: RowTask) -> RowTask:
+            known = known_rows.get(task.record.get('excel_row'))
+            if known:
+                task.resolve(known[0], **known[1])
+            return skip_empty(task)
+
+        def extract_on_scheduler(task: RowTask) -> RowTask:
+            if task.resolved:
+                return task
+            if not admitted or job.is_cancelled:
+                raise ExtractionCancelled()
+
+            def run() -> RowTask:
+                try:
+                    return scheduler.submit(job.job_id, partial(
+                        extract_with_model, task, model_name,
+                        cancel_token=job.cancel_token,
+                        keep_alive=model_manager.job_keep_alive,
+                        metrics=job.metrics,
+                        budgeted=budgeted,
+                        fast_model=fast_model,
+                        sparse=sparse,
+                        prefix_prompt=prefix_prompt
+                    )).result()
+                except CancelledError:
+                    # Stopping the job drops its queued rows; anything else cancelling one is an error
+                    if job.is_cancelled:
+                        raise ExtractionCancelled()
+                    raise
+
+            # Only the first of identical rows goes to the scheduler; the others wait here,
+            # in the llm stage, without holding one of the model workers
+            return extract_coalesced(task, run, cancel_token=job.cancel_token, metrics=job.metrics)
+
+        processed_data = []
+
+        # Rows go into the workbook as they finish, so only the save is left once the last row is done;
+        # the provenance columns are fixed up front since the header is written first
+        provenance = sorted({column for _, extra in known_rows.values() for column in extra})
+        if NEAR_DUPLICATE_THRESHOLD > 0:
+            provenance += ['near_duplicate_score', 'near_duplicate_of']
+        output_writer = OrderedRowWriter((r['excel_row'] for r in extracted_data), OUTPUT_COLUMNS + provenance)
+
+        def write_row(new_record: Dict) -> Dict:
+            processed_data.append(new_record)
+            output_writer.add(new_record['excel_row'], new_record)
+            job.add_result(new_record)
+            idx = len(processed_data)
+            job.progress["current"] = idx
+            job.metrics.set('pipeline', pipeline.stats())
+            logger.info(f"Row {idx}/{total_rows} ({(idx/total_rows)*100:.1f}%)")
+            return new_record
+
+        # Every row goes through the stages below, each with its own workers and a bounded queue
+        stage_workers = app.config['PIPELINE_STAGE_WORKERS']
+        queue_size = app.config['PIPELINE_QUEUE_SIZE']
+        stages = [
+            ('rules', apply_rules),
+            ('preprocess', partial(preprocess_row, model_name=model_name, metrics=job.metrics)
+                if preprocess else (lambda task: task)),
+            ('cache', partial(lookup_cached, model_name=model_name, fast_model=fast_model, sparse=sparse,
+                              prefix_prompt=prefix_prompt, metrics=job.metrics)),
+            ('llm', extract_on_scheduler),
+            ('normalize', finish_record),
+            ('writer', write_row)
         ]
+        pipeline = Pipeline([
+            # An llm stage without its own setting keeps every scheduler worker busy,
+            # with room for rows waiting on an identical row already being extracted
+            Stage(name, fn, workers=stage_workers.get(name) or 2 * scheduler.num_workers, queue_size=queue_size)
+            for name, fn in stages
+        ])
+        pipeline.run(RowTask(record) for record in extracted_data)
+        job.metrics.set('pipeline', pipeline.stats())
+
+        if job.is_cancelled:
+            logger.info("Processing stopped by user")
+
+        # Remember what the model extracted so the next file with these parts skips it;
+        # fields copied from a near duplicate are drafts and would come back as trusted hits
+        product_master.record_extractions([
+            r for r in processed_data
+            if 'product_master' not in r and 'reprocess' not in r and 'near_duplicate_of' not in r
+            and any(r.get(field) for field in TARGET_COLUMNS)
+        ], model_name)
         
-        # Reorder columns and fill missing columns with empty strings
-        for col in columns:
-            if col not in df.columns:
-                df[col] = ''
-                
-        # Select only the columns we want in the order we want
-        df = df[columns]
-        
-        logger.info("Generating Excel file")
+        logger.info("Processing complete")
+        logger.info(f"Saving Excel file, {output_writer.buffered} rows still waiting on a dropped row")
         
         try:
-            df.to_excel(
-                output_excel,
-                index=False,
-                engine='openpyxl',
-                sheet_name='Processed Data'
-            )
+            output = output_writer.close()
         except Exception as excel_error:
             logger.error(f"Excel creation failed")
             raise
 
         # Check if processing was stopped early
-        was_stopped = stop_processing.is_set()
+        was_stopped = job.is_cancelled
         if was_stopped:
             logger.info("Sending partial results")
 
-        # Verify file exists and is not empty
-        if not output_excel.exists():
-            raise Exception("Output file was not created")
-        
-        if output_excel.stat().st_size == 0:
+        # Verify the workbook is not empty
+        if not output.getbuffer().nbytes:
             raise Exception("Output file is empty")
 
+        # Output is flushed, release anyone waiting on /api/stop
+        job.finish('stopped' if was_stopped else 'complete')
+
         # Send the Excel file
         return send_file(
-            output_excel,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            output,
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
             download_name='processed_results.xlsx'
         )
 
     except Exception as e:
         logger.error(f"Process failed: {str(e)}")
+        if job and not job.is_finished:
+            job.finish('failed')
         return jsonify({'error': str(e)}), 500
         
     finally:
-        # Reset progress and stop signal
-        progress_data = {"current": 0, "total": 0}
-        stop_processing.clear()
+        if job:
+            wait_stats = scheduler.unregister_job(job.job_id)
+            if wait_stats:
+                job.metrics.set('scheduler', wait_stats)
+        for name in models_in_use:
+            model_manager.job_finished(name)
+        if admitted:
+            admission.release(job.job_id)
+
+        # Mark the job finished; it stays registered for late snapshots until the storage manager lets it go
+        if job and not job.is_finished:
+            job.finish('stopped' if job.is_cancelled else 'complete')
+        if job:
+            storage.track('result', job.job_id, len(json.dumps(job.snapshot(), default=str)),
+                          partial(forget_job, job), job_id=job.job_id,
+                          ttl=app.config['JOB_RETENTION_SECONDS'])
         
-        # Clean up temporary files
-        for file in [temp_excel, output_excel]:
-            if file and file.exists():
-                try:
-                    file.unlink()
-                except Exception as e:
-                    logger.error(f"Cleanup failed: {str(e)}")
+        # Free the upload's memory
+        if pinned_id:
+            storage.unpin(pinned_id)
+        if upload_id:
+            upload_store.remove(upload_id)
+            storage.forget('upload', upload_id)
+
+def forget_job(job: Job) -> None:
+    """Drop a finished job unless a later run of the same upload has taken its place"""
+    with jobs_lock:
+        if jobs.get(job.job_id) is job:
+            del jobs[job.job_id]
+
+def request_user() -> str:
+    """Caller identity for per-user limits and audit"""
+    return request.headers.get('X-User-Id') or request.remote_addr or 'anonymous'
+
+def form_flag(field: str, default: bool) -> bool:
+    """On/off form field of /api/process, falling back to the configured default"""
+    value = request.form.get(field)
+    return default if value is None else value.lower() in ('1', 'true')
+
+def request_job_id() -> Optional[str]:
+    """Job ID sent as JSON, form field or query parameter"""
+    body = request.get_json(silent=True) or {}
+    return body.get('job_id') or request.form.get('job_id') or request.args.get('job_id')
+
+def find_job(job_id: Optional[str]) -> Optional[Job]:
+    """Look up a job, falling back to the most recent one for older clients"""
+    if job_id:
+        return jobs.get(job_id)
+    return current_job
+
+def keep_upload(upload):
+    """Hand a stored upload to the storage manager so it is dropped if never processed"""
+    storage.track('upload', upload.upload_id, upload.size, partial(upload_store.remove, upload.upload_id),
+                  job_id=upload.upload_id, ttl=app.config['UPLOAD_TTL_SECONDS'], shared_key=upload.fingerprint)
 
 # Run the Flask application on the specified host and port
 if __name__ == '__main__':
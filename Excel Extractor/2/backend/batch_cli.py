@@ -0,0 +1,242 @@
+"""
+Process every workbook in a directory without the web UI.
+
+    python batch_cli.py ./incoming --output-dir ./processed --concurrency 4
+
+Finished rows are appended to a checkpoint next to each output, so an
+interrupted run picks up where it stopped. Exits non-zero when a workbook
+fails or rows come back without any fields.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from src.excel_parser.excel_parser import ExcelParser
+from src.excel_parser.excel_writer import write_excel
+from src.ai.inference_backend import get_backend
+from src.ai.model_manager import ModelManager
+from src.ai.ollama_handler import GENERATION_BUDGET, TARGET_COLUMNS, warmup_options
+from src.ai.cancellation import CancelToken, ExtractionCancelled
+from src.jobs.extraction import extract_record, EMPTY_DESCRIPTIONS
+from src.jobs.job_metrics import JobMetrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract structured fields from a directory of Excel workbooks")
+    parser.add_argument('input_dir', help="Directory with the .xlsx files to process")
+    parser.add_argument('--output-dir', help="Where processed workbooks, checkpoints and the summary go (default: <input_dir>/processed)")
+    parser.add_argument('--sheet', help="Sheet to read (default: the first sheet of each workbook)")
+    parser.add_argument('--part-cell', default='A1', help="Header cell of the part numbers (default: A1)")
+    parser.add_argument('--desc-cell', default='B1', help="Header cell of the descriptions (default: B1)")
+    parser.add_argument('--vendor-cell', default='C1', help="Header cell of the vendors (default: C1)")
+    parser.add_argument('--model', default=os.getenv('OLLAMA_MODEL', 'deepseek-r1:7b'), help="Model for extraction")
+    parser.add_argument('--fast-model', help="Try this model first and escalate rows that fail validation")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Rows sent to the model at the same time (default: the backend's batch size per host)")
+    parser.add_argument('--sparse', action='store_true', help="Ask only for the fields of each row's product group")
+    parser.add_argument('--no-preprocess', action='store_true', help="Send descriptions to the model as they are")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore existing checkpoints and start every workbook over")
+    parser.add_argument('--force', action='store_true', help="Also reprocess workbooks that already have an output")
+    parser.add_argument('--keep-alive', default='60m', help="How long the model stays loaded between rows (default: 60m)")
+    return parser.parse_args(argv)
+
+
+def find_workbooks(input_dir: Path) -> List[Path]:
+    """Input workbooks, leaving out Excel lock files and our own outputs"""
+    return sorted(
+        path for path in input_dir.glob('*.xlsx')
+        if not path.name.startswith('~$') and not path.stem.endswith('_processed')
+    )
+
+
+def is_failed(record: Dict[str, Any]) -> bool:
+    """A row with a real description that came back without any field"""
+    return (record.get('description', '') not in EMPTY_DESCRIPTIONS
+            and not any(record.get(field) for field in TARGET_COLUMNS))
+
+
+class Checkpoint:
+    """Append-only JSON lines file of finished output records, keyed by excel_row"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = Lock()
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        done = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line is cut short if the run was killed mid-write
+                    continue
+                done[record['excel_row']] = record
+        return done
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+
+    def remove(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+
+def process_workbook(path: Path, output_dir: Path, args: argparse.Namespace,
+                     cancel_token: CancelToken) -> Dict[str, Any]:
+    """Run one workbook through the pipeline and return its summary"""
+    started = time.time()
+    output = output_dir / f"{path.stem}_processed.xlsx"
+    checkpoint = Checkpoint(output_dir / f"{path.stem}.checkpoint.jsonl")
+    summary = {'file': path.name, 'output': str(output), 'status': 'complete', 'rows': 0,
+               'resumed_rows': 0, 'extracted_rows': 0, 'failed_rows': 0, 'error': None}
+
+    if args.no_resume or args.force:
+        checkpoint.remove()
+    if output.exists() and not args.force and not checkpoint.path.exists():
+        summary['status'] = 'skipped'
+        return summary
+
+    parser = ExcelParser(str(path))
+    sheet = args.sheet or next(iter(ExcelParser.get_sheet_names(str(path))), None)
+    if sheet is None or not parser.load_file(sheet_name=sheet):
+        raise ValueError(f"Could not read sheet {sheet!r}")
+    records = parser.extract_data(args.part_cell, args.desc_cell, args.vendor_cell)
+    if not records:
+        raise ValueError("No data found in specified cells")
+    summary['rows'] = len(records)
+
+    done = checkpoint.load()
+    results = [done[r['excel_row']] for r in records if r['excel_row'] in done]
+    pending = [r for r in records if r['excel_row'] not in done]
+    summary['resumed_rows'] = len(results)
+    if results:
+        logger.info(f"{path.name}: resuming, {len(results)}/{len(records)} rows already done")
+
+    metrics = JobMetrics()
+    with ThreadPoolExecutor(max_workers=max(args.concurrency, 1)) as executor:
+        futures = [
+            executor.submit(
+                extract_record, record, args.model,
+                cancel_token=cancel_token,
+                keep_alive=args.keep_alive,
+                metrics=metrics,
+                fast_model=args.fast_model,
+                sparse=args.sparse,
+                preprocess=not args.no_preprocess
+            )
+            for record in pending
+        ]
+        try:
+            for future in as_completed(futures):
+                try:
+                    new_record = future.result()
+                except ExtractionCancelled:
+                    continue
+                results.append(new_record)
+                # Failed rows stay out of the checkpoint so the next run retries them
+                if is_failed(new_record):
+                    summary['failed_rows'] += 1
+                else:
+                    summary['extracted_rows'] += 1
+                    checkpoint.append(new_record)
+                logger.info(f"{path.name}: row {len(results)}/{len(records)}")
+        except KeyboardInterrupt:
+            # Abort the rows in flight instead of waiting for the rest of the workbook
+            cancel_token.cancel()
+            for future in futures:
+                future.cancel()
+            raise
+
+    if cancel_token.is_cancelled:
+        summary['status'] = 'interrupted'
+        return summary
+
+    results.sort(key=lambda r: r.get('excel_row') or 0)
+    write_excel(results, output)
+    if not summary['failed_rows']:
+        checkpoint.remove()
+
+    summary['seconds'] = round(time.time() - started, 1)
+    summary['metrics'] = metrics.summary()
+    return summary
+
+
+def print_summary(summaries: List[Dict[str, Any]]) -> None:
+    print(f"\n{'File':40} {'Status':12} {'Rows':>6} {'Resumed':>8} {'Extracted':>10} {'Failed':>7}")
+    for s in summaries:
+        print(f"{s['file'][:40]:40} {s['status']:12} {s['rows']:>6} {s['resumed_rows']:>8} "
+              f"{s['extracted_rows']:>10} {s['failed_rows']:>7}")
+        if s['error']:
+            print(f"    {s['error']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    input_dir = Path(args.input_dir)
+    if not input_dir.is_dir():
+        logger.error(f"Not a directory: {input_dir}")
+        return 2
+    output_dir = Path(args.output_dir) if args.output_dir else input_dir / 'processed'
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    workbooks = find_workbooks(input_dir)
+    if not workbooks:
+        logger.error(f"No .xlsx files in {input_dir}")
+        return 2
+
+    # Keep the models loaded for the whole run instead of reloading them per workbook
+    model_manager = ModelManager(get_backend(), job_keep_alive=args.keep_alive)
+    if args.concurrency is None:
+        args.concurrency = get_backend().batch_size * len(get_backend().host_pool.hosts)
+    models = ([args.fast_model] if args.fast_model else []) + [args.model]
+    for name in models:
+        model_manager.job_started(name, warmup_options(name, GENERATION_BUDGET))
+
+    cancel_token = CancelToken()
+    summaries = []
+    try:
+        for path in workbooks:
+            logger.info(f"Processing {path.name}")
+            try:
+                summaries.append(process_workbook(path, output_dir, args, cancel_token))
+            except Exception as e:
+                logger.error(f"{path.name} failed: {str(e)}")
+                summaries.append({'file': path.name, 'status': 'failed', 'rows': 0, 'resumed_rows': 0,
+                                  'extracted_rows': 0, 'failed_rows': 0, 'error': str(e)})
+    except KeyboardInterrupt:
+        logger.info("Interrupted, finished rows are kept in the checkpoints")
+        cancel_token.cancel()
+        return 130
+    finally:
+        for name in models:
+            model_manager.job_finished(name)
+        with open(output_dir / 'summary.json', 'w') as f:
+            json.dump(summaries, f, indent=2)
+
+    print_summary(summaries)
+    ok = all(s['status'] in ('complete', 'skipped') and not s['failed_rows'] for s in summaries)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import logging
+from threading import Event, Lock
+from typing import Callable, Set
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCancelled(Exception):
+    """Raised when an extraction is aborted by its job being cancelled"""
+
+
+class CancelToken:
+    """Cancellation signal that also closes in-flight model connections"""
+
+    def __init__(self):
+        self._event = Event()
+        self._lock = Lock()
+        self._closers: Set[Callable[[], None]] = set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            closers = list(self._closers)
+            self._closers.clear()
+
+        # Closing the HTTP client aborts a generation that is still streaming
+        for close in closers:
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Failed to close in-flight request: {str(e)}")
+
+    def register(self, close: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._closers.add(close)
+                return
+        close()
+        raise ExtractionCancelled()
+
+    def unregister(self, close: Callable[[], None]) -> None:
+        with self._lock:
+            self._closers.discard(close)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise ExtractionCancelled()
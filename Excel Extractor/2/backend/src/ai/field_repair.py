@@ -0,0 +1,91 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from src.ai.field_validation import YES_NO_FIELDS, validate_fields
+from src.matching.category_matcher import CategoryMatcher
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+YES_VALUES = ['y', 'yes', 'true']
+NO_VALUES = ['n', 'no', 'false', 'none']
+
+
+def coerce_value(field: str, value: Any) -> Optional[str]:
+    """String form of a model value, or None when its type cannot be used"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = 'Y' if value else 'N'
+    elif isinstance(value, (int, float)):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+
+    # Spelled-out answers are normalized here instead of costing a re-query
+    if field in YES_NO_FIELDS:
+        if value.strip().lower() in YES_VALUES:
+            return 'Y'
+        if value.strip().lower() in NO_VALUES:
+            return 'N'
+    return value.strip()
+
+
+def check_fields(raw: Dict[str, Any], expected: List[str], description: str,
+                 matcher: Optional[CategoryMatcher] = None,
+                 require_all: bool = True) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Split a parsed model answer into usable values and failed fields.
+    Returns (values, failures) where failures maps field -> reason.
+    """
+    values = {}
+    failures = {}
+    for field in expected:
+        if field not in raw:
+            if require_all:
+                failures[field] = 'missing'
+            continue
+        value = coerce_value(field, raw[field])
+        if value is None:
+            failures[field] = f"got {type(raw[field]).__name__} instead of a string"
+        else:
+            values[field] = value
+
+    # Grounding is only a confidence signal, not a reason to re-query a field
+    for field, reason in validate_fields(values, description, matcher, grounding=False).items():
+        failures[field] = reason
+        values.pop(field)
+    return values, failures
+
+
+def build_repair_prompt(description: str, failures: Dict[str, str]) -> str:
+    """Follow-up prompt asking only for the fields that failed"""
+    problems = "\n".join(f"- {field}: {reason}" for field, reason in failures.items())
+    return f"""
+These fields extracted from an industrial equipment description were missing or invalid:
+{problems}
+
+Description:
+{description}
+
+Return ONLY valid JSON with exactly these keys and string values. Use empty string if not present.
+Y/N fields must be "Y" or "N".
+{json.dumps({field: "" for field in failures}, indent=2)}
+"""
+
+
+def build_repair_messages(description: str, failures: Dict[str, str]) -> List[Dict[str, str]]:
+    """The follow-up prompt as chat messages, the description last like the first prompt"""
+    problems = "\n".join(f"- {field}: {reason}" for field, reason in failures.items())
+    return [
+        {"role": "system", "content": f"""These fields extracted from an industrial equipment description were missing or invalid:
+{problems}
+
+Return ONLY valid JSON with exactly these keys and string values. Use empty string if not present.
+Y/N fields must be "Y" or "N".
+{json.dumps({field: "" for field in failures}, indent=2)}"""},
+        {"role": "user", "content": f"Description:\n{description}"}
+    ]
@@ -0,0 +1,67 @@
+import re
+import logging
+from typing import Dict, Optional
+from src.matching.category_matcher import CategoryMatcher, normalize_text
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+YES_NO_FIELDS = ["NACE (Y/N)", "Fireproof (Y/N)", "API (Y/N)", "ASME (Y/N)"]
+
+# Fields whose value has to contain a number
+NUMERIC_FIELDS = ["Horsepower", "RPM", "Phase", "Voltage", "Hertz", "Specific Gravity"]
+
+# Fields the model may infer rather than copy from the description
+INFERRED_FIELDS = YES_NO_FIELDS + ["Product Type", "Operation", "Other"]
+
+
+def is_grounded(value: str, description: str) -> bool:
+    """Whether some word or number of the value appears in the description"""
+    desc_words = set(normalize_text(description).split())
+    desc_digits = set(re.findall(r'\d+', description))
+    for word in normalize_text(value).split():
+        if word in desc_words or any(word in desc_word for desc_word in desc_words if len(word) >= 3):
+            return True
+    return any(number in desc_digits for number in re.findall(r'\d+', value))
+
+
+def validate_fields(fields: Dict[str, str], description: str,
+                    matcher: Optional[CategoryMatcher] = None,
+                    grounding: bool = True) -> Dict[str, str]:
+    """
+    Rule-based checks of extracted fields.
+    Returns field -> reason for every value that looks wrong; empty values pass.
+    grounding=False skips the check that copied values appear in the description.
+    """
+    issues = {}
+    for field, value in fields.items():
+        if not isinstance(value, str):
+            issues[field] = 'not a string'
+            continue
+        value = value.strip()
+        if not value:
+            continue
+
+        if field in YES_NO_FIELDS:
+            if value not in ('Y', 'N'):
+                issues[field] = 'not Y or N'
+        elif field in NUMERIC_FIELDS and not re.search(r'\d', value):
+            issues[field] = 'not a number'
+        elif matcher and matcher.has_buckets(field) and not matcher.match_attribute(field, value):
+            issues[field] = 'not in categories'
+        elif grounding and field not in INFERRED_FIELDS and not is_grounded(value, description):
+            issues[field] = 'not in description'
+    return issues
+
+
+def looks_low_confidence(fields: Dict[str, str], description: str,
+                         matcher: Optional[CategoryMatcher] = None) -> Optional[str]:
+    """Reason to distrust an otherwise valid extraction, or None"""
+    if not any(value.strip() for value in fields.values() if isinstance(value, str)):
+        return 'nothing extracted'
+    if matcher and not fields.get('Product Type', '').strip() and matcher.match_subgroups(description):
+        return 'product type missed'
+    return None
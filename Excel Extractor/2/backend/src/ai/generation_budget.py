@@ -0,0 +1,91 @@
+import json
+import logging
+import re
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Reasoning output some models put in front of the answer
+THINK_PATTERN = re.compile(r'<think>.*?(</think>|$)', re.DOTALL)
+
+
+def strip_reasoning(text: str) -> str:
+    """Remove <think> blocks (closed or cut off) from a model response"""
+    return THINK_PATTERN.sub('', text)
+
+
+class GenerationBudget:
+    """
+    Per-model limits on how much a model may read and write for one row.
+    num_ctx is sized from the prompt length, converted to tokens with a
+    chars-per-token ratio measured from the server's own prompt_tokens counts.
+    num_predict is capped at the size of the JSON object the model must return,
+    plus a reasoning allowance for reasoning models that keep thinking enabled.
+    """
+
+    def __init__(self, reasoning_models: List[str], disable_thinking: bool = True,
+                 value_tokens: int = 12, reasoning_tokens: int = 1024,
+                 ctx_step: int = 1024, max_ctx: int = 32768,
+                 chars_per_token: float = 3.0):
+        self.reasoning_models = [name.lower() for name in reasoning_models]
+        self.disable_thinking = disable_thinking
+        self.value_tokens = value_tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.ctx_step = ctx_step
+        self.max_ctx = max_ctx
+        self.default_chars_per_token = chars_per_token
+        self._lock = Lock()
+        self._chars_per_token: Dict[str, float] = {}
+        self._num_ctx: Dict[str, int] = {}
+
+    def is_reasoning_model(self, model: str) -> bool:
+        return any(name in model.lower() for name in self.reasoning_models)
+
+    def estimate_tokens(self, model: str, text: str) -> int:
+        with self._lock:
+            ratio = self._chars_per_token.get(model, self.default_chars_per_token)
+        return int(len(text) / ratio) + 1
+
+    def observe_prompt(self, model: str, prompt_chars: int, prompt_tokens: int) -> None:
+        """Refine the chars-per-token ratio with a prompt_tokens count from the server"""
+        if not prompt_tokens:
+            return
+        measured = prompt_chars / prompt_tokens
+        with self._lock:
+            previous = self._chars_per_token.get(model)
+            # Keep the lowest ratio seen so estimates err on the side of more tokens
+            self._chars_per_token[model] = measured if previous is None else min(previous, measured)
+
+    def output_tokens(self, model: str, fields: List[str]) -> int:
+        """Tokens needed for a JSON object with the given keys and short string values"""
+        keys = self.estimate_tokens(model, json.dumps({field: '' for field in fields}))
+        limit = keys + self.value_tokens * len(fields)
+        if self.is_reasoning_model(model) and not self.disable_thinking:
+            limit += self.reasoning_tokens
+        return limit
+
+    def think(self, model: str) -> Optional[bool]:
+        """False to switch thinking off, None for models without a thinking mode"""
+        if self.disable_thinking and self.is_reasoning_model(model):
+            return False
+        return None
+
+    def options(self, model: str, prompt: str, fields: List[str],
+                attempt: int = 0) -> Tuple[Dict[str, Any], Optional[bool]]:
+        """Generation options and think flag for one call; retries get a larger output cap"""
+        num_predict = self.output_tokens(model, fields) * (2 ** attempt)
+        needed = self.estimate_tokens(model, prompt) + num_predict
+        num_ctx = -(-needed // self.ctx_step) * self.ctx_step
+
+        with self._lock:
+            # Ollama reloads a model whenever num_ctx changes, so the context
+            # only ever grows, in steps, and settles after the first few rows
+            num_ctx = min(max(num_ctx, self._num_ctx.get(model, 0)), self.max_ctx)
+            self._num_ctx[model] = num_ctx
+
+        return {'num_ctx': num_ctx, 'num_predict': num_predict}, self.think(model)
@@ -0,0 +1,142 @@
+import logging
+import time
+from contextlib import contextmanager
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from src.ai.cancellation import ExtractionCancelled
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Host:
+    """Load and health bookkeeping for one inference server"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'avg_latency_seconds': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'last_error': self.last_error
+        }
+
+
+class HostPool:
+    """
+    Routes each request to the healthy host with the fewest outstanding requests.
+    Hosts that fail repeatedly or fail the periodic health check are drained:
+    they get no new requests until a health check succeeds again.
+    health_check(url) should raise when the host cannot serve requests.
+    """
+
+    def __init__(self, urls: List[str], health_check: Callable[[str], None],
+                 health_interval: float = 15.0, failure_threshold: int = 3,
+                 latency_smoothing: float = 0.2):
+        if not urls:
+            raise ValueError("At least one inference host is required")
+        self.hosts = [Host(url.rstrip('/')) for url in urls]
+        self.health_check = health_check
+        self.failure_threshold = failure_threshold
+        self.latency_smoothing = latency_smoothing
+        self._lock = Lock()
+
+        if health_interval > 0:
+            Thread(target=self._health_loop, args=(health_interval,),
+                   name="host-health", daemon=True).start()
+
+    @property
+    def urls(self) -> List[str]:
+        return [host.url for host in self.hosts]
+
+    def _pick(self) -> Host:
+        candidates = [host for host in self.hosts if host.healthy]
+        if not candidates:
+            # Everything looks down; keep trying rather than failing every row
+            candidates = self.hosts
+        return min(candidates, key=lambda h: (h.outstanding, h.latency_ewma or 0.0))
+
+    @contextmanager
+    def acquire(self) -> Iterator[str]:
+        """Reserve the least loaded host for one request and yield its URL"""
+        with self._lock:
+            host = self._pick()
+            host.outstanding += 1
+            host.requests += 1
+
+        started = time.time()
+        try:
+            yield host.url
+        except ExtractionCancelled:
+            raise
+        except Exception as e:
+            self._record_failure(host, str(e))
+            raise
+        else:
+            self._record_success(host, time.time() - started)
+        finally:
+            with self._lock:
+                host.outstanding -= 1
+
+    def _record_success(self, host: Host, latency: float) -> None:
+        with self._lock:
+            host.consecutive_failures = 0
+            if host.latency_ewma is None:
+                host.latency_ewma = latency
+            else:
+                alpha = self.latency_smoothing
+                host.latency_ewma = alpha * latency + (1 - alpha) * host.latency_ewma
+
+    def _record_failure(self, host: Host, error: str) -> None:
+        with self._lock:
+            host.failures += 1
+            host.consecutive_failures += 1
+            host.last_error = error
+            if host.healthy and host.consecutive_failures >= self.failure_threshold:
+                host.healthy = False
+                logger.warning(f"Draining host {host.url} after {host.consecutive_failures} failures")
+
+    def check_health(self) -> None:
+        """Ping every host and update which ones receive new requests"""
+        for host in self.hosts:
+            try:
+                self.health_check(host.url)
+                healthy, error = True, None
+            except Exception as e:
+                healthy, error = False, str(e)
+
+            with self._lock:
+                if healthy and not host.healthy:
+                    logger.info(f"Host {host.url} is healthy again")
+                    host.consecutive_failures = 0
+                elif not healthy and host.healthy:
+                    logger.warning(f"Host {host.url} failed health check: {error}")
+                host.healthy = healthy
+                if error:
+                    host.last_error = error
+
+    def _health_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"Health check error: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {host.url: host.stats() for host in self.hosts}
@@ -0,0 +1,340 @@
+import os
+import json
+import logging
+import socket
+import httpx
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src.ai.cancellation import CancelToken
+from src.ai.host_pool import HostPool
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class ChatResult:
+    """Generated text plus whatever token and timing counters the server reported"""
+
+    def __init__(self, content: str, metrics: Optional[Dict[str, Any]] = None):
+        self.content = content
+        self.metrics = metrics or {}
+
+
+class InferenceBackend(ABC):
+    """
+    Base for chat inference servers.
+    Options use Ollama names (temperature, num_predict, num_ctx); each backend
+    maps them onto its own API. Every call streams, so a CancelToken can abort
+    the request even before the first token arrives. Servers batch the requests
+    they have in flight; batch_size is how many each host is sent at once.
+    """
+
+    name = ''
+    chat_path = ''
+    default_batch_size = 1
+
+    def __init__(self, host_pool: HostPool, timeout: Optional[float] = None,
+                 headers: Optional[Dict[str, str]] = None, batch_size: Optional[int] = None):
+        self.host_pool = host_pool
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.batch_size = max(int(batch_size or self.default_batch_size), 1)
+
+    def chat(self, model: str, messages: Messages, options: Optional[Dict[str, Any]] = None,
+             json_output: bool = False, cancel_token: Optional[CancelToken] = None,
+             keep_alive: Optional[str] = None, think: Optional[bool] = None) -> ChatResult:
+        """think=False switches off the reasoning phase of models that have one"""
+        payload = self._chat_payload(model, messages, options or {}, json_output, keep_alive)
+        if think is not None:
+            self._set_think(payload, think)
+        with self.host_pool.acquire() as base_url:
+            parts = []
+            metrics = {}
+            for line in self._stream_lines(base_url, self.chat_path, payload, cancel_token):
+                content, line_metrics = self._parse_line(line)
+                if content:
+                    parts.append(content)
+                metrics.update(line_metrics)
+            return ChatResult("".join(parts), metrics)
+
+    def load_model(self, model: str, base_url: str, keep_alive: str,
+                   options: Optional[Dict[str, Any]] = None) -> None:
+        """Preload a model; servers that load models at startup have nothing to do"""
+
+    def unload_model(self, model: str, base_url: str) -> None:
+        """Release a model's memory; a no-op where the server owns model lifetime"""
+
+    @abstractmethod
+    def health_check(self, base_url: str) -> None:
+        """Raise when the server at base_url cannot serve requests"""
+
+    @abstractmethod
+    def model_status(self, model: str, base_url: str) -> Dict[str, Any]:
+        """reachable, model_available and model_loaded for one server, plus error if it failed"""
+
+    @abstractmethod
+    def _chat_payload(self, model: str, messages: Messages, options: Dict[str, Any],
+                      json_output: bool, keep_alive: Optional[str]) -> Dict[str, Any]:
+        """Streaming request body in the server's own format"""
+
+    @abstractmethod
+    def _set_think(self, payload: Dict[str, Any], think: bool) -> None:
+        """Switch the reasoning phase on or off in the payload"""
+
+    @abstractmethod
+    def _parse_line(self, line: str) -> Tuple[str, Dict[str, Any]]:
+        """Content and counters of one streamed line"""
+
+    def _get(self, base_url: str, path: str, timeout: float = 3.0) -> Dict[str, Any]:
+        response = httpx.get(f"{base_url}{path}", headers=self.headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, base_url: str, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = httpx.post(f"{base_url}{path}", json=payload, headers=self.headers,
+                              timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _stream_lines(self, base_url: str, path: str, payload: Dict[str, Any],
+                      cancel_token: Optional[CancelToken]) -> Iterator[str]:
+        # Closing a socket does not wake a thread blocked in recv(), shutting it down does.
+        # The httpcore trace hook hands us the socket as soon as it is connected.
+        sockets = []
+
+        def abort():
+            for sock in sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        def trace(event_name, info):
+            if event_name == 'connection.connect_tcp.complete' and info.get('return_value'):
+                sock = info['return_value'].get_extra_info('socket')
+                if sock is not None:
+                    sockets.append(sock)
+                    if cancel_token and cancel_token.is_cancelled:
+                        abort()
+
+        if cancel_token:
+            cancel_token.register(abort)
+        try:
+            with httpx.Client(base_url=base_url, headers=self.headers, timeout=self.timeout) as client:
+                with client.stream('POST', path, json=payload, extensions={'trace': trace}) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if cancel_token:
+                            cancel_token.raise_if_cancelled()
+                        if line.strip():
+                            yield line
+        except Exception:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            raise
+        finally:
+            if cancel_token:
+                cancel_token.unregister(abort)
+
+
+class OllamaBackend(InferenceBackend):
+    """Ollama's native /api/chat endpoint"""
+
+    name = 'ollama'
+    chat_path = '/api/chat'
+    default_batch_size = 2  # Ollama's OLLAMA_NUM_PARALLEL on most machines
+
+    def _chat_payload(self, model, messages, options, json_output, keep_alive):
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': True,
+            'options': options
+        }
+        if json_output:
+            payload['format'] = 'json'
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        return payload
+
+    def _set_think(self, payload, think):
+        payload['think'] = think
+
+    def _parse_line(self, line):
+        chunk = json.loads(line)
+        if chunk.get('error'):
+            raise RuntimeError(chunk['error'])
+        content = chunk.get('message', {}).get('content', '')
+        if not chunk.get('done'):
+            return content, {}
+
+        # Durations are reported in nanoseconds on the final chunk
+        return content, {
+            'prompt_tokens': chunk.get('prompt_eval_count', 0),
+            'completion_tokens': chunk.get('eval_count', 0),
+            'prompt_eval_seconds': chunk.get('prompt_eval_duration', 0) / 1e9,
+            'eval_seconds': chunk.get('eval_duration', 0) / 1e9,
+            'load_seconds': chunk.get('load_duration', 0) / 1e9,
+            'total_seconds': chunk.get('total_duration', 0) / 1e9,
+            'truncated': chunk.get('done_reason') == 'length'
+        }
+
+    def load_model(self, model, base_url, keep_alive, options=None):
+        # A generate request without a prompt only loads the model.
+        # Load with the context size rows will use, or the first row reloads it.
+        payload = {'model': model, 'keep_alive': keep_alive}
+        if options:
+            payload['options'] = options
+        self._post(base_url, '/api/generate', payload)
+
+    def unload_model(self, model, base_url):
+        self._post(base_url, '/api/generate', {'model': model, 'keep_alive': 0})
+
+    def health_check(self, base_url):
+        self._get(base_url, '/api/tags')
+
+    def model_status(self, model, base_url):
+        # Ollama lists untagged models as <name>:latest
+        model_tag = model if ':' in model else f"{model}:latest"
+        status = {'reachable': False, 'model_available': False, 'model_loaded': False}
+        try:
+            installed = [m.get('model') or m.get('name') for m in self._get(base_url, '/api/tags').get('models', [])]
+            status['reachable'] = True
+            status['model_available'] = model_tag in installed
+
+            running = [m.get('model') or m.get('name') for m in self._get(base_url, '/api/ps').get('models', [])]
+            status['model_loaded'] = model_tag in running
+        except Exception as e:
+            logger.warning(f"Ollama status check failed: {str(e)}")
+            status['error'] = str(e)
+        return status
+
+
+class OpenAICompatibleBackend(InferenceBackend):
+    """OpenAI-style /v1/chat/completions, as served by llama.cpp llama-server and vLLM"""
+
+    name = 'openai'
+    chat_path = '/v1/chat/completions'
+    # Continuous batching groups whatever is in flight; match llama-server --parallel or vLLM max_num_seqs
+    default_batch_size = 4
+
+    def _chat_payload(self, model, messages, options, json_output, keep_alive):
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': True,
+            'stream_options': {'include_usage': True}
+        }
+        if 'temperature' in options:
+            payload['temperature'] = options['temperature']
+        if options.get('num_predict'):
+            payload['max_tokens'] = options['num_predict']
+        if json_output:
+            payload['response_format'] = {'type': 'json_object'}
+        # Context size and keep_alive are server settings here and are ignored
+        return payload
+
+    def _set_think(self, payload, think):
+        # Passed to the chat template, which Qwen3-style templates read (vLLM, llama-server --jinja)
+        payload['chat_template_kwargs'] = {'enable_thinking': think}
+
+    def _parse_line(self, line):
+        if not line.startswith('data:'):
+            return '', {}
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return '', {}
+
+        chunk = json.loads(data)
+        if chunk.get('error'):
+            raise RuntimeError(str(chunk['error']))
+        content = ''
+        metrics = {}
+        for choice in chunk.get('choices') or []:
+            content += (choice.get('delta') or {}).get('content') or ''
+            if choice.get('finish_reason'):
+                metrics['truncated'] = choice['finish_reason'] == 'length'
+
+        usage = chunk.get('usage')
+        if usage:
+            metrics['prompt_tokens'] = usage.get('prompt_tokens', 0)
+            metrics['completion_tokens'] = usage.get('completion_tokens', 0)
+        # llama-server adds its own timings in milliseconds
+        timings = chunk.get('timings')
+        if timings:
+            metrics['prompt_eval_seconds'] = timings.get('prompt_ms', 0) / 1000
+            metrics['eval_seconds'] = timings.get('predicted_ms', 0) / 1000
+        return content, metrics
+
+    def health_check(self, base_url):
+        self._get(base_url, '/v1/models')
+
+    def model_status(self, model, base_url):
+        status = {'reachable': False, 'model_available': False, 'model_loaded': False}
+        try:
+            served = [m.get('id') for m in self._get(base_url, '/v1/models').get('data', [])]
+            status['reachable'] = True
+            # These servers only list models they have loaded
+            status['model_available'] = status['model_loaded'] = model in served
+        except Exception as e:
+            logger.warning(f"Model status check failed: {str(e)}")
+            status['error'] = str(e)
+        return status
+
+
+BACKENDS = {
+    OllamaBackend.name: OllamaBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend
+}
+
+_backend: Optional[InferenceBackend] = None
+_backend_lock = Lock()
+
+
+def _host_urls(list_var: str, single_var: str, default: str) -> List[str]:
+    urls = [url.strip() for url in os.getenv(list_var, '').split(',') if url.strip()]
+    return urls or [os.getenv(single_var, default)]
+
+
+def get_backend() -> InferenceBackend:
+    """
+    Shared backend chosen by INFERENCE_BACKEND (ollama or openai).
+    Ollama hosts come from OLLAMA_HOSTS (comma separated) or OLLAMA_BASE_URL,
+    OpenAI-compatible hosts from OPENAI_BASE_URLS or OPENAI_BASE_URL.
+    OLLAMA_BATCH_SIZE or OPENAI_BATCH_SIZE sets how many requests each host is sent at once.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv('INFERENCE_BACKEND', 'ollama').lower()
+            if kind not in BACKENDS:
+                raise ValueError(f"Unknown INFERENCE_BACKEND: {kind}")
+
+            if kind == 'openai':
+                urls = _host_urls('OPENAI_BASE_URLS', 'OPENAI_BASE_URL', 'http://host.docker.internal:8080')
+                api_key = os.getenv('OPENAI_API_KEY')
+                headers = {'Authorization': f"Bearer {api_key}"} if api_key else {}
+                batch_size = os.getenv('OPENAI_BATCH_SIZE')
+            else:
+                urls = _host_urls('OLLAMA_HOSTS', 'OLLAMA_BASE_URL', 'http://host.docker.internal:11434')
+                headers = {}
+                batch_size = os.getenv('OLLAMA_BATCH_SIZE')
+
+            backend_class = BACKENDS[kind]
+            # The pool's health check needs the backend, so wire it up afterwards
+            backend = backend_class(host_pool=None, headers=headers, batch_size=batch_size)
+            backend.host_pool = HostPool(
+                urls,
+                health_check=backend.health_check,
+                health_interval=float(os.getenv('HEALTH_CHECK_INTERVAL', '15'))
+            )
+            _backend = backend
+            logger.info(f"Using {kind} backend on {', '.join(backend.host_pool.urls)}, "
+                        f"{backend.batch_size} requests per host")
+        return _backend
@@ -0,0 +1,84 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from typing import Any, Dict, Optional
+from src.ai.inference_backend import InferenceBackend
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """
+    Keeps models loaded on every host while jobs use them.
+    A job preloads its model when admitted, and every row request refreshes
+    keep_alive to job_keep_alive so the model cannot expire mid-job. Once no job
+    has used a model for idle_unload_seconds it is unloaded explicitly.
+    """
+
+    def __init__(self, backend: InferenceBackend, job_keep_alive: str = '60m',
+                 idle_unload_seconds: float = 600, check_interval: float = 30):
+        self.backend = backend
+        self.job_keep_alive = job_keep_alive
+        self.idle_unload_seconds = idle_unload_seconds
+        self._lock = Lock()
+        self._active_jobs: Dict[str, int] = {}
+        self._idle_since: Dict[str, float] = {}  # Models we loaded that no job is using
+
+        if idle_unload_seconds > 0:
+            Thread(target=self._idle_loop, args=(check_interval,),
+                   name="model-idle-unloader", daemon=True).start()
+
+    def job_started(self, model: str, options: Optional[Dict[str, Any]] = None) -> float:
+        """Register a job and preload its model; returns the cold-start time in seconds"""
+        with self._lock:
+            self._active_jobs[model] = self._active_jobs.get(model, 0) + 1
+            self._idle_since.pop(model, None)
+
+        started = time.time()
+        urls = self.backend.host_pool.urls
+        # Load on every host at once; the slowest host determines the cold start
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            for url, error in zip(urls, executor.map(lambda url: self._load(model, url, options), urls)):
+                if error:
+                    logger.warning(f"Warm-up of {model} on {url} failed: {error}")
+        cold_start = time.time() - started
+        logger.info(f"Model {model} ready after {cold_start:.1f}s")
+        return cold_start
+
+    def job_finished(self, model: str) -> None:
+        with self._lock:
+            remaining = self._active_jobs.get(model, 0) - 1
+            if remaining > 0:
+                self._active_jobs[model] = remaining
+            else:
+                self._active_jobs.pop(model, None)
+                self._idle_since[model] = time.time()
+
+    def _load(self, model: str, url: str, options: Optional[Dict[str, Any]] = None):
+        try:
+            self.backend.load_model(model, url, self.job_keep_alive, options)
+            return None
+        except Exception as e:
+            return str(e)
+
+    def _idle_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                cutoff = time.time() - self.idle_unload_seconds
+                expired = [model for model, since in self._idle_since.items() if since < cutoff]
+                for model in expired:
+                    self._idle_since.pop(model)
+
+            for model in expired:
+                logger.info(f"Unloading {model} after {self.idle_unload_seconds:.0f}s idle")
+                for url in self.backend.host_pool.urls:
+                    try:
+                        self.backend.unload_model(model, url)
+                    except Exception as e:
+                        logger.warning(f"Unloading {model} on {url} failed: {str(e)}")
@@ -2,11 +2,17 @@ import os
 import json
 import logging
 import time
-import ollama
+from functools import partial
 import requests 
 from flask import current_app
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Union
+from src.ai.cancellation import CancelToken, ExtractionCancelled
+from src.ai.inference_backend import get_backend
+from src.ai.generation_budget import GenerationBudget, strip_reasoning
+from src.ai.field_repair import check_fields, build_repair_prompt, build_repair_messages
+from src.ai.sparse_schema import select_schema
+from src.matching.category_matcher import get_category_matcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,15 +39,29 @@ def create_empty_fields() -> Dict[str, str]:
 
 
 
-def parse_description_with_ollama(description: str, model_name: str) -> Dict[str, Any]:
-    if not description or description.strip() in ("???", ""):
-        return create_empty_fields()
-    
-    try:
-        base_url = os.getenv('OLLAMA_BASE_URL', 'http://host.docker.internal:11434')
-        client = ollama.Client(host=base_url)
-        
-        prompt = f"""
+# Part of every cache key; bump it whenever the prompts change so old results are not reused
+PROMPT_VERSION = '2'
+
+# Ask the server to constrain output to JSON (Ollama format / OpenAI response_format)
+STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', '0') == '1'
+
+# Static instructions and schema first as a system message and the description last,
+# so the server can reuse the cached prompt prefix between rows (PREFIX_PROMPTS=0 for the inline layout)
+PREFIX_PROMPTS = os.getenv('PREFIX_PROMPTS', '1') == '1'
+
+# Re-query only the fields that come back missing or invalid (FIELD_REPAIR=0 to keep what the model returned)
+FIELD_REPAIR = os.getenv('FIELD_REPAIR', '1') == '1'
+
+# Size num_ctx and num_predict per model and switch off reasoning (GENERATION_BUDGET=0 for unbounded calls)
+GENERATION_BUDGET = os.getenv('GENERATION_BUDGET', '1') == '1'
+generation_budget = GenerationBudget(
+    reasoning_models=[m.strip() for m in os.getenv('REASONING_MODELS', 'deepseek-r1,qwq,qwen3').split(',') if m.strip()],
+    disable_thinking=os.getenv('DISABLE_THINKING', '1') == '1'
+)
+
+
+def build_prompt(description: str) -> str:
+    return f"""
 As an industrial equipment expert, extract as much data the following fields from this description as possible that you are confident about.
 Return them as strings exactly. Use empty string if not present.
 IMPORTANT: Return ONLY valid JSON with these exact fields, nothing else.
@@ -56,41 +76,166 @@ Required JSON structure:
 Remember: Return ONLY the JSON object, no additional text.
 """
 
+
+def build_sparse_prompt(description: str, fields: List[str]) -> str:
+    """Prompt for only the fields that apply to the product, leaving out empty keys"""
+    return f"""
+As an industrial equipment expert, extract as much data the following fields from this description as possible that you are confident about.
+Return them as strings exactly. Leave out every field that is not present.
+IMPORTANT: Return ONLY a valid JSON object using only these field names, nothing else.
+Ensure all property names are in double quotes and all values are strings.
+
+Description:
+{description}
+
+Fields:
+{json.dumps(fields)}
+
+Remember: Return ONLY the JSON object, no additional text.
+"""
+
+
+def build_system_prompt(fields: Optional[List[str]] = None) -> str:
+    """Everything but the description; the same for every row (or every row of a product group)"""
+    if fields is None:
+        return f"""As an industrial equipment expert, extract as much data the following fields from the description as possible that you are confident about.
+Return them as strings exactly. Use empty string if not present.
+IMPORTANT: Return ONLY valid JSON with these exact fields, nothing else.
+Ensure all property names are in double quotes and all values are strings.
+
+Required JSON structure:
+{json.dumps(create_empty_fields(), indent=2)}
+
+Remember: Return ONLY the JSON object, no additional text."""
+    return f"""As an industrial equipment expert, extract as much data the following fields from the description as possible that you are confident about.
+Return them as strings exactly. Leave out every field that is not present.
+IMPORTANT: Return ONLY a valid JSON object using only these field names, nothing else.
+Ensure all property names are in double quotes and all values are strings.
+
+Fields:
+{json.dumps(fields)}
+
+Remember: Return ONLY the JSON object, no additional text."""
+
+
+def build_prefix_messages(description: str, fields: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """Chat messages with the static system prefix first and the description last"""
+    return [
+        {"role": "system", "content": build_system_prompt(fields)},
+        {"role": "user", "content": f"Description:\n{description}"}
+    ]
+
+
+def warmup_options(model_name: str, budgeted: Optional[bool] = None) -> Dict[str, Any]:
+    """Options to preload a model with so the first row does not trigger a reload"""
+    if not (GENERATION_BUDGET if budgeted is None else budgeted):
+        return {}
+    options, _ = generation_budget.options(model_name, build_prompt(''), TARGET_COLUMNS)
+    return {'num_ctx': options['num_ctx']}
+
+
+
+def _chat_json(model_name: str, prompt: Union[str, List[Dict[str, str]]], fields: List[str], attempt: int, budgeted: bool,
+               cancel_token: Optional[CancelToken], keep_alive: Optional[str],
+               on_call: Optional[Callable[[str, float, Dict], None]],
+               repair: bool = False) -> Optional[Any]:
+    """Send one prompt (or ready-made chat messages) and parse the JSON object in the answer; None if there is none"""
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+    prompt_text = "\n".join(message["content"] for message in messages)
+
+    # Retries get a larger output cap in case the last answer was cut off
+    options, think = {}, None
+    if budgeted:
+        options, think = generation_budget.options(model_name, prompt_text, fields, attempt)
+    options['temperature'] = 0.1
+
+    # Each attempt goes to the least loaded healthy host
+    started = time.time()
+    result = get_backend().chat(
+        model_name,
+        messages,
+        options=options,
+        json_output=STRUCTURED_OUTPUT,
+        cancel_token=cancel_token,
+        keep_alive=keep_alive,
+        think=think
+    )
+    if budgeted:
+        generation_budget.observe_prompt(model_name, len(prompt_text), result.metrics.get('prompt_tokens', 0))
+    if on_call:
+        # Retries and repairs belong to the row of the first call
+        on_call(model_name, time.time() - started,
+                dict(result.metrics, budgeted=budgeted, retry=attempt > 0 or repair, repair=repair,
+                     prefix_prompt=len(messages) > 1))
+
+    # Reasoning can contain braces of its own, drop it before looking for the JSON
+    response_text = strip_reasoning(result.content).strip()
+    response_text = response_text.replace('\n', ' ').replace('\r', '')
+    response_text = ' '.join(response_text.split())
+
+    start = response_text.find('{')
+    end = response_text.rfind('}') + 1
+    if 0 <= start < end:
+        return json.loads(response_text[start:end])
+    return None
+
+
+def parse_description_with_ollama(description: str, model_name: str,
+                                  cancel_token: Optional[CancelToken] = None,
+                                  keep_alive: Optional[str] = None,
+                                  on_call: Optional[Callable[[str, float, Dict], None]] = None,
+                                  budgeted: Optional[bool] = None,
+                                  on_repair: Optional[Callable[[Dict[str, str]], None]] = None,
+                                  sparse: bool = False,
+                                  on_schema: Optional[Callable[[Optional[str]], None]] = None,
+                                  prefix_prompt: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Extract TARGET_COLUMNS from a description.
+    on_call(model, latency_seconds, server_metrics) is invoked after every model call,
+    on_repair(failures) with field -> reason whenever fields had to be re-queried.
+    budgeted overrides GENERATION_BUDGET for this call.
+    sparse asks only for the fields of the product group the subgroup matcher finds,
+    reported through on_schema(group); unknown products still get every field.
+    prefix_prompt overrides PREFIX_PROMPTS for this call.
+    """
+    if not description or description.strip() in ("???", ""):
+        return create_empty_fields()
+    if budgeted is None:
+        budgeted = GENERATION_BUDGET
+    if prefix_prompt is None:
+        prefix_prompt = PREFIX_PROMPTS
+    call = partial(_chat_json, model_name, budgeted=budgeted, cancel_token=cancel_token,
+                   keep_alive=keep_alive, on_call=on_call)
+    
+    try:
+        group, requested = None, TARGET_COLUMNS
+        if sparse:
+            group, requested = select_schema(description, TARGET_COLUMNS, get_category_matcher())
+            if on_schema:
+                on_schema(group)
+        # A sparse answer leaves out empty keys, so missing keys are not errors
+        if prefix_prompt:
+            prompt = build_prefix_messages(description, requested if group else None)
+        else:
+            prompt = build_sparse_prompt(description, requested) if group else build_prompt(description)
+
         # Make the API call with retry logic
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = client.chat(
-                    model=model_name,
-                    messages=[{
-                        "role": "user", 
-                        "content": prompt
-                    }],
-                    options={'temperature': 0.1}
-                )
-                
-                response_text = response["message"]["content"].strip()
-                response_text = response_text.replace('\n', ' ').replace('\r', '')
-                response_text = ' '.join(response_text.split())
-                
-                start = response_text.find('{')
-                end = response_text.rfind('}') + 1
-                
-                if 0 <= start < end:
-                    json_text = response_text[start:end]
-                    
-                    try:
-                        extracted_fields = json.loads(json_text)
-                        extracted_fields = {k: str(v) if v is not None else "" for k, v in extracted_fields.items()}
-                        fields = create_empty_fields()
-                        fields.update(extracted_fields)
-                        return fields
-                        
-                    except json.JSONDecodeError:
-                        if attempt == max_retries - 1:
-                            raise
-                        continue
-                
+                extracted = call(prompt, requested, attempt)
+                if isinstance(extracted, dict):
+                    fields = create_empty_fields()
+                    fields.update(repair_fields(extracted, description, call, on_repair,
+                                                expected=requested, require_all=not group,
+                                                prefix_prompt=prefix_prompt))
+                    return fields
+
+            except json.JSONDecodeError:
+                if attempt == max_retries - 1:
+                    raise
+            except ExtractionCancelled:
+                raise
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
@@ -98,10 +243,47 @@ Remember: Return ONLY the JSON object, no additional text.
         
         return create_empty_fields()
         
+    except ExtractionCancelled:
+        raise
     except Exception as e:
         logger.error(f"Extraction error: {str(e)}")
         return create_empty_fields()
 
+
+def repair_fields(extracted: Dict[str, Any], description: str, call: Callable,
+                  on_repair: Optional[Callable[[Dict[str, str]], None]] = None,
+                  expected: Optional[List[str]] = None,
+                  require_all: bool = True,
+                  prefix_prompt: bool = False) -> Dict[str, str]:
+    """
+    Validate every expected field and re-query only the ones that are missing or invalid.
+    Fields that are still invalid after the follow-up are left empty.
+    """
+    if not FIELD_REPAIR:
+        return {k: str(v) if v is not None else "" for k, v in extracted.items()}
+
+    matcher = get_category_matcher()
+    values, failures = check_fields(extracted, expected or TARGET_COLUMNS, description, matcher,
+                                    require_all=require_all)
+    if not failures:
+        return values
+
+    if on_repair:
+        on_repair(failures)
+    try:
+        prompt = (build_repair_messages if prefix_prompt else build_repair_prompt)(description, failures)
+        repaired = call(prompt, list(failures), 0, repair=True)
+    except ExtractionCancelled:
+        raise
+    except Exception as e:
+        logger.warning(f"Field repair failed: {str(e)}")
+        return values
+
+    if isinstance(repaired, dict):
+        fixed, _ = check_fields(repaired, list(failures), description, matcher, require_all=False)
+        values.update(fixed)
+    return values
+
 def process_data(data: List[Dict]) -> List[Dict]:
     """Process a list of records and return updated records with AI extraction"""
     try:
@@ -0,0 +1,78 @@
+import logging
+from typing import List, Optional, Tuple
+from src.matching.category_matcher import CategoryMatcher, normalize_text
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Fields worth asking for whatever the product is
+COMMON_FIELDS = [
+    "Size", "Length", "Height", "Manufacturer", "Product Type", "Body Material",
+    "Mfr Model Number", "Vendor Material Number", "Pressure", "Temperature", "Other"
+]
+
+CONNECTION_FIELDS = ["Flange Class", "Pipe Class", "Connection Type 1", "Connection Type 2"]
+ELECTRICAL_FIELDS = ["Horsepower", "RPM", "Phase", "Voltage", "Hertz", "Class 1 Division", "NEMA"]
+
+# Extra fields per kind of product, keyed by a word that names it
+SCHEMA_FIELDS = {
+    'valve': CONNECTION_FIELDS + [
+        "Trim Material", "Seat/Elastomer material", "NACE (Y/N)", "Fireproof (Y/N)",
+        "API (Y/N)", "ASME (Y/N)", "Operation"
+    ],
+    'pump': CONNECTION_FIELDS + ELECTRICAL_FIELDS + [
+        "Pump Type", "Flow Rate", "Specific Gravity", "Seat/Elastomer material", "API (Y/N)"
+    ],
+    'motor': ELECTRICAL_FIELDS,
+    'meter': CONNECTION_FIELDS + ["Meter Type", "Orifice Diameter", "Flow Rate", "Specific Gravity"],
+    'gauge': ["Connection Type 1", "Meter Type"],
+    'flange': CONNECTION_FIELDS + ["NACE (Y/N)", "ASME (Y/N)"],
+    'fitting': CONNECTION_FIELDS + ["NACE (Y/N)", "ASME (Y/N)"],
+    'pipe': CONNECTION_FIELDS + ["NACE (Y/N)", "ASME (Y/N)", "Perforation Size"],
+    'screen': ["Perforation Size", "Connection Type 1"],
+    'gasket': ["Flange Class", "Seat/Elastomer material"]
+}
+
+
+def _schema_keys(text: str) -> List[str]:
+    words = normalize_text(text).split()
+    # Plurals name the same product ("valves", "fittings")
+    words += [word[:-1] for word in words if word.endswith('s')]
+    return [key for key in SCHEMA_FIELDS if key in words]
+
+
+def select_schema(description: str, all_fields: List[str],
+                  matcher: Optional[CategoryMatcher] = None) -> Tuple[Optional[str], List[str]]:
+    """
+    Pick the fields that apply to a description's product group.
+    The group comes from the subgroup matcher when categories are loaded, a
+    product group can list its own fields under "fields" in categories.json,
+    and otherwise the product words of the description decide.
+    Returns (group, fields); (None, all_fields) when the product is unknown.
+    """
+    group = None
+    keys: List[str] = []
+    if matcher:
+        subgroups = matcher.match_subgroups(description)
+        if subgroups:
+            group = matcher.subgroup_to_group.get(subgroups[0])
+            group_data = matcher.buckets.get('productGroups', {}).get(group, {})
+            if group_data.get('fields'):
+                fields = [f for f in all_fields if f in COMMON_FIELDS or f in group_data['fields']]
+                return group, fields
+            keys = _schema_keys(f"{group} {subgroups[0]}")
+
+    if not keys:
+        keys = _schema_keys(description)
+        group = group or (keys[0] if keys else None)
+    if not keys:
+        return None, all_fields
+
+    wanted = set(COMMON_FIELDS)
+    for key in keys:
+        wanted.update(SCHEMA_FIELDS[key])
+    # Keep the output column order
+    return group, [field for field in all_fields if field in wanted]
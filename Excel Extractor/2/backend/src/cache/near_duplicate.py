@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import random
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+from src.matching.category_matcher import normalize_text
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Mersenne prime for the universal hash family a * x + b mod p
+_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int = 5) -> FrozenSet[str]:
+    """Character shingles of the normalized text"""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    """One indexed description and the result extracted from it"""
+
+    def __init__(self, namespace: Hashable, description: str, shingle_set: FrozenSet[str],
+                 bands: List[Tuple], result: Dict[str, Any]):
+        self.namespace = namespace
+        self.description = description
+        self.shingles = shingle_set
+        self.bands = bands
+        self.result = result
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of previously extracted descriptions.
+    Each description becomes a MinHash signature of num_perm hashes over its
+    shingles, split into bands; descriptions sharing any band are candidates,
+    and candidates are ranked by their exact shingle Jaccard similarity.
+    With 16 bands of 4 rows, pairs above ~0.5 similarity are usually found.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 20000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._lock = Lock()
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        self._buckets: Dict[Tuple, Set[int]] = {}
+        self._next_id = 0
+        self.lookups = 0
+        self.matches = 0
+
+    def _signature(self, shingle_set: FrozenSet[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big')
+                  for s in shingle_set]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature: List[int]) -> List[Tuple]:
+        return [(idx, tuple(signature[idx * self.rows:(idx + 1) * self.rows]))
+                for idx in range(self.bands)]
+
+    def add(self, namespace: Hashable, description: str, result: Dict[str, Any]) -> None:
+        shingle_set = shingles(description)
+        if not shingle_set or self.max_entries <= 0:
+            return
+        bands = self._band_keys(self._signature(shingle_set))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(namespace, description, shingle_set, bands, dict(result))
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        entry_id, entry = self._entries.popitem(last=False)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+    def find(self, namespace: Hashable, description: str) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        """Most similar indexed description at or above threshold: (score, description, result)"""
+        shingle_set = shingles(description)
+        if not shingle_set:
+            return None
+        bands = self._band_keys(self._signature(shingle_set))
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for band in bands:
+                candidates.update(self._buckets.get(band, ()))
+
+            best = None
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.namespace != namespace:
+                    continue
+                score = jaccard(shingle_set, entry.shingles)
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, entry.description, dict(entry.result))
+            if best:
+                self.matches += 1
+            return best
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'matches': self.matches
+            }
@@ -0,0 +1,72 @@
+import logging
+from concurrent.futures import CancelledError
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from src.ai.cancellation import CancelToken, ExtractionCancelled
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """One in-flight call that later callers with the same key wait for"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs fn,
+    callers arriving while it runs wait for and share its result.
+    """
+
+    def __init__(self, poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self._lock = Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           cancel_token: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        """Run or join the call for key; returns (result, shared)"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result, False
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.done.set()
+
+            # Waiting callers stay stoppable by their own job
+            while not call.done.wait(self.poll_interval):
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+            if isinstance(call.error, (ExtractionCancelled, CancelledError)):
+                # The leader's job was stopped, or its queued row dropped, not ours; run it ourselves
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'in_flight': len(self._calls), 'coalesced_calls': self.coalesced}
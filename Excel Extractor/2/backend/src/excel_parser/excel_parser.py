@@ -2,7 +2,7 @@ import pandas as pd
 import logging
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import IO, Dict, List, Tuple, Optional, Union
 from flask import current_app
 
 logging.basicConfig(
@@ -11,9 +11,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# A path on disk or a binary file-like object such as an in-memory upload
+WorkbookSource = Union[str, Path, IO[bytes]]
+
+
+def _rewind(source: WorkbookSource) -> WorkbookSource:
+    """Paths as Path objects, file-like objects moved back to their start so they can be read again"""
+    if isinstance(source, (str, Path)):
+        return Path(source)
+    source.seek(0)
+    return source
+
+
 class ExcelParser:
-    def __init__(self, file_path: str):
-        self.file_path = Path(file_path)
+    def __init__(self, file_path: WorkbookSource):
+        self.file_path = _rewind(file_path)
         self.df = None
         
     @staticmethod
@@ -31,7 +43,7 @@ class ExcelParser:
     def load_file(self, sheet_name: Optional[str] = None) -> bool:
         try:
             self.df = pd.read_excel(
-                self.file_path,
+                _rewind(self.file_path),
                 sheet_name=sheet_name,
                 engine='openpyxl'
             )
@@ -42,10 +54,10 @@ class ExcelParser:
         
     
     @classmethod
-    def get_sheet_names(cls, file_path: str) -> list:
+    def get_sheet_names(cls, file_path: WorkbookSource) -> list:
         """Get list of sheet names from Excel file"""
         try:
-            with pd.ExcelFile(file_path) as xls:
+            with pd.ExcelFile(_rewind(file_path), engine='openpyxl') as xls:
                 return xls.sheet_names
         except Exception as e:
             logger.error(f"Error reading sheets: {str(e)}")
@@ -66,7 +78,7 @@ class ExcelParser:
     def load_file(self, sheet_name: Optional[str] = None) -> bool:
         try:
             self.df = pd.read_excel(
-                self.file_path,
+                _rewind(self.file_path),
                 sheet_name=sheet_name,
                 engine='openpyxl'
             )
@@ -0,0 +1,157 @@
+import io
+import logging
+import pandas as pd
+from openpyxl import Workbook
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Column order of the processed output workbook
+OUTPUT_COLUMNS = [
+    'part_number',
+    'description',
+    'Vendor',
+    'Size',
+    'Length',
+    'Height',
+    'Flange Class',
+    'Pipe Class',
+    'Manufacturer',
+    'Connection Type 1',
+    'Connection Type 2',
+    'Product Type',
+    'Body Material',
+    'Trim Material',
+    'Seat/Elastomer material',
+    'NACE (Y/N)',
+    'Fireproof (Y/N)',
+    'API (Y/N)',
+    'ASME (Y/N)',
+    'Operation',
+    'Mfr Model Number',
+    'Vendor Material Number',
+    'Meter Type',
+    'Perforation Size',
+    'Orifice Diameter',
+    'Pump Type',
+    'Horsepower',
+    'RPM',
+    'Phase',
+    'Voltage',
+    'Hertz',
+    'Class 1 Division',
+    'NEMA',
+    'Specific Gravity',
+    'Pressure',
+    'Flow Rate',
+    'Temperature',
+    'Other'
+]
+
+# Where a row's fields came from when not from its own model call, so reused results can be
+# reviewed as drafts; added after OUTPUT_COLUMNS only when some row has them
+PROVENANCE_COLUMNS = [
+    'product_master',  # 'approved' or 'extracted' entry of the product master
+    'reprocess',  # 'carried' over from the previous output
+    'near_duplicate_score',  # Similarity to the description the fields were copied from
+    'near_duplicate_of'
+]
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'
+
+
+def build_output_dataframe(records: List[Dict]) -> pd.DataFrame:
+    """Build the output DataFrame with every output column in order, then any provenance columns"""
+    df = pd.DataFrame(records)
+
+    # Reorder columns and fill missing columns with empty strings
+    for col in OUTPUT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+
+    provenance = [col for col in PROVENANCE_COLUMNS if col in df.columns and df[col].notna().any()]
+
+    # Select only the columns we want in the order we want
+    return df[OUTPUT_COLUMNS + provenance]
+
+
+def write_excel(records: List[Dict], target: Union[str, Path, io.BytesIO]) -> None:
+    build_output_dataframe(records).to_excel(
+        target,
+        index=False,
+        engine='openpyxl',
+        sheet_name='Processed Data'
+    )
+
+
+def write_csv(records: List[Dict], target: Union[str, Path, io.BytesIO]) -> None:
+    csv_text = build_output_dataframe(records).to_csv(index=False)
+    if isinstance(target, io.BytesIO):
+        target.write(csv_text.encode('utf-8-sig'))
+    else:
+        Path(target).write_text(csv_text, encoding='utf-8-sig')
+
+
+def render_records(records: List[Dict], file_format: str = 'xlsx') -> io.BytesIO:
+    """Render records to an in-memory xlsx or csv file"""
+    buffer = io.BytesIO()
+    if file_format == 'csv':
+        write_csv(records, buffer)
+    else:
+        write_excel(records, buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class OrderedRowWriter:
+    """
+    Writes rows into a write-only workbook as they finish, in sheet order.
+    Rows finishing ahead of an earlier one wait in a reorder buffer until it is
+    written; a row that never arrives, e.g. dropped by a failing stage, holds the
+    rows after it until close().
+    """
+
+    def __init__(self, positions: Iterable[int], columns: Optional[List[str]] = None):
+        self.columns = columns or OUTPUT_COLUMNS
+        self._order = sorted(positions)
+        self._next = 0  # Index into _order of the next row to write
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._lock = Lock()
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet('Processed Data')
+        self._sheet.append(self.columns)
+        self.written = 0
+
+    def add(self, position: int, record: Dict[str, Any]) -> None:
+        """Buffer a finished row and write every row it was holding back"""
+        with self._lock:
+            self._pending[position] = record
+            while self._next < len(self._order) and self._order[self._next] in self._pending:
+                self._write(self._pending.pop(self._order[self._next]))
+                self._next += 1
+
+    @property
+    def buffered(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._sheet.append([record.get(col) for col in self.columns])
+        self.written += 1
+
+    def close(self) -> io.BytesIO:
+        """Write the rows still buffered behind missing ones and return the workbook"""
+        with self._lock:
+            for position in sorted(self._pending):
+                self._write(self._pending.pop(position))
+            buffer = io.BytesIO()
+            self._workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
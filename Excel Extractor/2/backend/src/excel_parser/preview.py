@@ -0,0 +1,188 @@
+import re
+import logging
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
+from openpyxl.utils import column_index_from_string, get_column_letter
+from src.excel_parser.excel_parser import WorkbookSource, _rewind
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Header keywords per start cell, best first
+HEADER_KEYWORDS = {
+    'part_cell': ['part number', 'part no', 'part #', 'part', 'pn', 'item number', 'item',
+                  'sku', 'material number', 'material'],
+    'desc_cell': ['description', 'item description', 'product description', 'desc', 'details'],
+    'vendor_cell': ['vendor', 'manufacturer', 'supplier', 'mfr', 'mfg', 'brand', 'make']
+}
+
+
+def _normalize_header(value: str) -> str:
+    return ' '.join(re.sub(r'[^a-z0-9#]+', ' ', value.lower()).split())
+
+
+def _keyword_rank(header: str, keywords: List[str]) -> Optional[Tuple[int, int]]:
+    """(0 for an exact match else 1, keyword position) of the best keyword in the header, lower is better"""
+    best = None
+    for position, keyword in enumerate(keywords):
+        if header == keyword:
+            rank = (0, position)
+        elif re.search(rf'(^| ){re.escape(keyword)}( |$)', header):
+            rank = (1, position)
+        else:
+            continue
+        if best is None or rank < best:
+            best = rank
+    return best
+
+
+def suggest_start_cells(rows: List[Tuple[int, List[str]]]) -> Dict[str, Any]:
+    """
+    Header cells for part_cell, desc_cell and vendor_cell from (row number, values) pairs.
+    The row matching the most keywords is taken as the header row, since all
+    start cells have to be on the same row; within it every header goes to the
+    start cell it matches best. Start cells without a matching header are None.
+    """
+    best_row, best_matches = None, {}
+    for row_number, values in rows:
+        candidates = []
+        for column, value in enumerate(values):
+            header = _normalize_header(value)
+            if not header:
+                continue
+            for field, keywords in HEADER_KEYWORDS.items():
+                rank = _keyword_rank(header, keywords)
+                if rank is not None:
+                    candidates.append((rank, column, field))
+
+        matches = {}
+        for rank, column, field in sorted(candidates):
+            if field not in matches and column not in matches.values():
+                matches[field] = column
+        if len(matches) > len(best_matches):
+            best_row, best_matches = row_number, matches
+
+    suggested = {field: None for field in HEADER_KEYWORDS}
+    for field, column in best_matches.items():
+        suggested[field] = f"{get_column_letter(column + 1)}{best_row}"
+    return {'header_row': best_row, **suggested}
+
+
+def _sheet_paths(archive: zipfile.ZipFile) -> Tuple[Dict[str, str], Optional[str]]:
+    """Archive path of every sheet by name, and of the shared strings part if there is one"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    shared_strings = None
+    for rel in rels:
+        target = rel.get('Target', '')
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'xl/{target}')
+        targets[rel.get('Id')] = path
+        if rel.get('Type', '').endswith('/sharedStrings'):
+            shared_strings = path
+    sheets = {sheet.get('name'): targets.get(sheet.get(REL_ID)) for sheet in workbook.iter(f'{MAIN}sheet')}
+    return sheets, shared_strings
+
+
+def _read_rows(stream: IO[bytes], max_rows: int, max_columns: int) -> List[Tuple[int, Dict[int, Tuple[str, str]]]]:
+    """First max_rows non-empty rows as (row number, column -> (cell type, raw value)), parsing no further"""
+    rows = []
+    row_number = 0
+    for _, elem in ET.iterparse(stream, events=('end',)):
+        if elem.tag != f'{MAIN}row':
+            continue
+        row_number = int(elem.get('r', row_number + 1))
+        cells = {}
+        column = 0
+        for cell in elem.iter(f'{MAIN}c'):
+            ref = cell.get('r')
+            column = column_index_from_string(ref.rstrip('0123456789')) if ref else column + 1
+            if column > max_columns:
+                continue
+            if cell.get('t') == 'inlineStr':
+                value = ''.join(t.text or '' for t in cell.iter(f'{MAIN}t'))
+            else:
+                v = cell.find(f'{MAIN}v')
+                value = v.text if v is not None and v.text is not None else ''
+            if value != '':
+                cells[column] = (cell.get('t', 'n'), value)
+        elem.clear()
+        if cells:
+            rows.append((row_number, cells))
+            if len(rows) >= max_rows:
+                break
+    return rows
+
+
+def _read_shared_strings(stream: IO[bytes], needed: Set[int]) -> Dict[int, str]:
+    """Shared strings at the needed indexes, stopping after the highest one"""
+    strings = {}
+    if not needed:
+        return strings
+    last = max(needed)
+    index = 0
+    for _, elem in ET.iterparse(stream, events=('end',)):
+        if elem.tag != f'{MAIN}si':
+            continue
+        if index in needed:
+            # Plain text is in si/t, rich text in si/r/t; phonetic hints (si/rPh) are left out
+            strings[index] = ''.join(
+                t.text or '' for t in elem.findall(f'{MAIN}t') + elem.findall(f'{MAIN}r/{MAIN}t')
+            )
+        elem.clear()
+        if index >= last:
+            break
+        index += 1
+    return strings
+
+
+def preview_sheet(source: WorkbookSource, sheet_name: Optional[str] = None, max_rows: int = 20,
+                  max_columns: int = 52) -> Dict[str, Any]:
+    """
+    First rows of a sheet (the first sheet by default) as strings, with column
+    letters and suggested start cells.
+    The sheet XML is streamed and parsing stops after the rows shown; shared
+    strings are read only up to the highest one those rows use, so the time
+    does not grow with the size of the workbook. Values are shown as stored,
+    dates as Excel serial numbers.
+    """
+    with zipfile.ZipFile(_rewind(source)) as archive:
+        sheets, shared_strings_path = _sheet_paths(archive)
+        sheet_name = sheet_name or next(iter(sheets), None)
+        if sheet_name not in sheets or sheets[sheet_name] is None:
+            raise ValueError(f"Unknown sheet: {sheet_name}")
+
+        with archive.open(sheets[sheet_name]) as stream:
+            raw_rows = _read_rows(stream, max_rows, max_columns)
+        needed = {int(value) for _, cells in raw_rows for kind, value in cells.values() if kind == 's'}
+        shared_strings = {}
+        if needed and shared_strings_path:
+            with archive.open(shared_strings_path) as stream:
+                shared_strings = _read_shared_strings(stream, needed)
+
+    width = max((max(cells) for _, cells in raw_rows), default=0)
+    rows = []
+    for row_number, cells in raw_rows:
+        values = [''] * width
+        for column, (kind, value) in cells.items():
+            if kind == 's':
+                value = shared_strings.get(int(value), '')
+            elif kind == 'b':
+                value = 'TRUE' if value == '1' else 'FALSE'
+            values[column - 1] = value
+        rows.append((row_number, values))
+
+    return {
+        'sheet_name': sheet_name,
+        'columns': [get_column_letter(index + 1) for index in range(width)],
+        'rows': [{'row': number, 'values': values} for number, values in rows],
+        'suggested': suggest_start_cells(rows)
+    }
@@ -0,0 +1,105 @@
+import logging
+from threading import Condition
+from typing import Callable, Dict, List, Optional, Tuple
+from src.ai.cancellation import CancelToken, ExtractionCancelled
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be accepted or queued right now"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits how much extraction work runs at once.
+    Jobs start while the global row budget allows it; otherwise they wait in a
+    FIFO queue, and are rejected once the queue or the per-user limit is full.
+    """
+
+    def __init__(self, max_active_rows: int, max_jobs_per_user: int,
+                 max_queued_jobs: int, retry_after: int):
+        self.max_active_rows = max_active_rows
+        self.max_jobs_per_user = max_jobs_per_user
+        self.max_queued_jobs = max_queued_jobs
+        self.retry_after = retry_after
+        self._cond = Condition()
+        self._active: Dict[str, Tuple[str, int]] = {}  # job_id -> (user, rows)
+        self._queue: List[Tuple[str, str, int]] = []  # (job_id, user, rows) in arrival order
+
+    def _active_rows(self) -> int:
+        return sum(rows for _, rows in self._active.values())
+
+    def _fits(self, rows: int) -> bool:
+        # A job larger than the whole budget may still run on an idle service
+        return not self._active or self._active_rows() + rows <= self.max_active_rows
+
+    def _user_jobs(self, user: str) -> int:
+        active = sum(1 for u, _ in self._active.values() if u == user)
+        queued = sum(1 for _, u, _ in self._queue if u == user)
+        return active + queued
+
+    def _position(self, job_id: str) -> int:
+        for idx, (queued_id, _, _) in enumerate(self._queue, 1):
+            if queued_id == job_id:
+                return idx
+        return 0
+
+    def admit(self, job_id: str, user: str, rows: int,
+              cancel_token: Optional[CancelToken] = None,
+              on_queued: Optional[Callable[[int], None]] = None) -> None:
+        """Block until the job may start; on_queued receives its queue position"""
+        with self._cond:
+            if self._user_jobs(user) >= self.max_jobs_per_user:
+                raise AdmissionRejected(
+                    f"User already has {self.max_jobs_per_user} job(s) running or queued",
+                    self.retry_after
+                )
+
+            if not self._queue and self._fits(rows):
+                self._active[job_id] = (user, rows)
+                return
+
+            if len(self._queue) >= self.max_queued_jobs:
+                raise AdmissionRejected("Extraction service is saturated", self.retry_after)
+
+            self._queue.append((job_id, user, rows))
+            logger.info(f"Job {job_id} queued at position {len(self._queue)}")
+            try:
+                while True:
+                    if cancel_token and cancel_token.is_cancelled:
+                        raise ExtractionCancelled()
+                    position = self._position(job_id)
+                    if position == 1 and self._fits(rows):
+                        break
+                    if on_queued:
+                        on_queued(position)
+                    self._cond.wait(1.0)
+                self._active[job_id] = (user, rows)
+            finally:
+                self._queue = [entry for entry in self._queue if entry[0] != job_id]
+                self._cond.notify_all()
+
+    def release(self, job_id: str) -> None:
+        with self._cond:
+            if self._active.pop(job_id, None) is not None:
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'active_jobs': len(self._active),
+                'active_rows': self._active_rows(),
+                'queued_jobs': len(self._queue),
+                'queued_rows': sum(rows for _, _, rows in self._queue),
+                'row_budget': self.max_active_rows
+            }
@@ -0,0 +1,203 @@
+import math
+import random
+import time
+import logging
+from concurrent.futures import CancelledError, Future
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+from src.ai.cancellation import ExtractionCancelled
+from src.ai.ollama_handler import TARGET_COLUMNS
+from src.ai.sparse_schema import select_schema
+from src.jobs.extraction import RowTask, extraction_key, preprocess_row, result_cache, skip_empty
+from src.jobs.job_metrics import JobMetrics
+from src.matching.category_matcher import get_category_matcher
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Description lengths (characters) separating short, medium and long prompts
+LENGTH_BUCKETS = (40, 120)
+
+
+def stratum_of(task: RowTask) -> Hashable:
+    """Product group and description length, the two things that drive tokens and latency per row"""
+    group = select_schema(task.prompt_description, TARGET_COLUMNS, get_category_matcher())[0]
+    length = sum(len(task.prompt_description) >= limit for limit in LENGTH_BUCKETS)
+    return (group or '', ('short', 'medium', 'long')[length])
+
+
+class RowPlan:
+    """What a full run would do with each row, found without calling the model"""
+
+    def __init__(self):
+        self.counts = {'total': 0, 'known': 0, 'skipped': 0, 'cached': 0, 'duplicate': 0, 'model': 0}
+        self.strata: Dict[Hashable, List[RowTask]] = {}  # Rows that need the model, by stratum
+
+
+def plan_rows(records: List[Dict], known_rows: Set[int], model_name: str,
+              fast_model: Optional[str] = None, sparse: bool = False,
+              prefix_prompt: bool = True, preprocess: bool = False) -> RowPlan:
+    """
+    Run every row through the cheap stages of the pipeline: rows already known
+    (carried over or in the product master), empty descriptions, cache hits and
+    repeats of a row earlier in the sheet need no model call of their own.
+    The cache is only peeked at, leaving its hit and miss counts alone, and near
+    duplicates are not looked for: a MinHash query per row would cost more than
+    the estimate saves, so rows they would resolve count as model rows.
+    """
+    plan = RowPlan()
+    seen = set()
+    for record in records:
+        plan.counts['total'] += 1
+        if record.get('excel_row') in known_rows:
+            plan.counts['known'] += 1
+            continue
+        task = skip_empty(RowTask(record))
+        if task.resolved:
+            plan.counts['skipped'] += 1
+            continue
+        if preprocess:
+            preprocess_row(task, model_name)
+        task.key = extraction_key(task.prompt_description, model_name, fast_model, sparse, prefix_prompt)
+        cached = result_cache.peek(task.key)
+        if cached is not None:
+            task.resolve(cached)
+            plan.counts['cached'] += 1
+        elif task.key in seen:
+            plan.counts['duplicate'] += 1
+        else:
+            seen.add(task.key)
+            plan.counts['model'] += 1
+            plan.strata.setdefault(stratum_of(task), []).append(task)
+    return plan
+
+
+def stratified_sample(plan: RowPlan, size: int, seed: int = 0) -> List[RowTask]:
+    """
+    Up to size rows that need the model, spread over the strata in proportion
+    to their share of those rows; every stratum gets at least one row while
+    the sample has room, largest strata first.
+    """
+    total = plan.counts['model']
+    if not total or size <= 0:
+        return []
+    size = min(size, total)
+    strata = sorted(plan.strata.items(), key=lambda item: -len(item[1]))
+
+    allocation = {key: 0 for key, _ in strata}
+    for key, _ in strata[:size]:
+        allocation[key] = 1
+    remaining = size - sum(allocation.values())
+    if remaining > 0:
+        # Largest remainder allocation of what is left, capped at each stratum's size
+        quotas = {key: remaining * len(tasks) / total for key, tasks in strata}
+        for key, tasks in strata:
+            allocation[key] = min(allocation[key] + math.floor(quotas[key]), len(tasks))
+        order = sorted(strata, key=lambda item: -(quotas[item[0]] % 1))
+        while sum(allocation.values()) < size:
+            for key, tasks in order:
+                if sum(allocation.values()) >= size:
+                    break
+                if allocation[key] < len(tasks):
+                    allocation[key] += 1
+
+    rng = random.Random(seed)
+    return [task for key, tasks in strata for task in rng.sample(tasks, allocation[key])]
+
+
+class SampledRow:
+    """Latency and token counts of one sampled row"""
+
+    def __init__(self, task: RowTask, seconds: float, metrics: JobMetrics):
+        self.task = task
+        self.seconds = seconds
+        models = metrics.summary()['models'].values()
+        self.calls = sum(m['calls'] for m in models)
+        self.tokens = round(sum((m['avg_prompt_tokens'] + m['avg_completion_tokens']) * m['calls'] for m in models))
+        self.failed = not any((task.fields or {}).values())
+
+
+def time_sample(sample: List[RowTask], extract: Callable[[RowTask, JobMetrics], Any],
+                submit: Callable[[Callable[[], SampledRow]], Future]) -> List[SampledRow]:
+    """Extract every sampled row through submit, timing each one where it runs"""
+
+    def timed(task: RowTask) -> SampledRow:
+        row_metrics = JobMetrics()
+        started = time.time()
+        extract(task, row_metrics)
+        return SampledRow(task, time.time() - started, row_metrics)
+
+    futures = [submit(partial(timed, task)) for task in sample]
+    sampled = []
+    for future in futures:
+        try:
+            sampled.append(future.result())
+        except (ExtractionCancelled, CancelledError):
+            # Stopping the dry run drops the rows still queued; estimate from those timed so far
+            continue
+    return sampled
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def project(plan: RowPlan, sampled: List[SampledRow], workers: int,
+            cold_start_seconds: float = 0.0, cost_per_1k_tokens: float = 0.0) -> Dict[str, Any]:
+    """
+    Duration and tokens of the full run, estimated stratum by stratum from the
+    sample. Rows extracted by the sample are in the result cache now, so the
+    projection covers only the rows the run still has to send to the model.
+    """
+    by_stratum: Dict[Hashable, List[SampledRow]] = {}
+    for row in sampled:
+        by_stratum.setdefault(stratum_of(row.task), []).append(row)
+    overall_seconds = _mean([row.seconds for row in sampled])
+    overall_tokens = _mean([row.tokens for row in sampled])
+
+    model_rows = 0
+    model_seconds = 0.0
+    tokens = 0.0
+    for key, tasks in plan.strata.items():
+        rows = by_stratum.get(key, [])
+        # Failed extractions are not cached, the run sends them to the model again
+        remaining = len(tasks) - sum(not row.failed for row in rows)
+        model_rows += remaining
+        # Strata the sample missed (it was smaller than the number of strata) use the overall averages
+        model_seconds += remaining * (_mean([row.seconds for row in rows]) if rows else overall_seconds)
+        tokens += remaining * (_mean([row.tokens for row in rows]) if rows else overall_tokens)
+
+    total = plan.counts['total'] or 1
+    latencies = sorted(row.seconds for row in sampled)
+    seconds = cold_start_seconds + model_seconds / max(workers, 1)
+    projection = {
+        'model_rows': model_rows,
+        'model_seconds': round(model_seconds, 1),
+        'workers': workers,
+        'cold_start_seconds': round(cold_start_seconds, 1),
+        'seconds': round(seconds, 1),
+        'minutes': round(seconds / 60, 1),
+        'tokens': round(tokens)
+    }
+    if cost_per_1k_tokens:
+        projection['cost'] = round(tokens / 1000 * cost_per_1k_tokens, 4)
+    return {
+        'rows': dict(plan.counts),
+        'rates': {
+            reason: round(plan.counts[reason] / total, 3)
+            for reason in ('known', 'skipped', 'cached', 'duplicate', 'model')
+        },
+        'sample': {
+            'rows': len(sampled),
+            'strata': len(plan.strata),
+            'failed_rows': sum(row.failed for row in sampled),
+            'calls': sum(row.calls for row in sampled),
+            'avg_latency_seconds': round(overall_seconds, 3),
+            'p90_latency_seconds': round(latencies[int(0.9 * (len(latencies) - 1))], 3) if latencies else 0.0,
+            'avg_tokens_per_row': round(overall_tokens, 1)
+        },
+        'projection': projection
+    }
@@ -0,0 +1,318 @@
+import os
+import re
+import logging
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from src.ai.cancellation import CancelToken, ExtractionCancelled
+from src.jobs.job_metrics import JobMetrics, generation_report, prompt_layout_report
+from src.ai.ollama_handler import (
+    parse_description_with_ollama, create_empty_fields, generation_budget, PROMPT_VERSION, TARGET_COLUMNS
+)
+from src.ai.sparse_schema import select_schema
+from src.cache.result_cache import ResultCache
+from src.cache.singleflight import SingleFlight
+from src.cache.near_duplicate import NearDuplicateIndex
+from src.ai.field_validation import validate_fields, looks_low_confidence, is_grounded, INFERRED_FIELDS
+from src.matching.category_matcher import get_category_matcher
+from src.preprocess.description_cleaner import get_description_cleaner
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Descriptions that carry no information and are never sent to the model
+EMPTY_DESCRIPTIONS = ['???', '(blank)', '']
+
+# Results shared by every job: finished ones by exact key, running ones through singleflight
+result_cache = ResultCache(int(os.getenv('RESULT_CACHE_SIZE', '10000')))
+in_flight = SingleFlight()
+
+# Reuse results of similar descriptions (same item, other tag or reference number); 0 disables
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+near_duplicates = NearDuplicateIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+
+
+def extraction_key(description: str, model_name: str, fast_model: Optional[str],
+                   sparse: bool, prefix_prompt: bool = True) -> Tuple:
+    """Everything that decides an extraction result: normalized description, models, prompt"""
+    return (' '.join(description.lower().split()), model_name, fast_model, sparse, prefix_prompt, PROMPT_VERSION)
+
+
+def spec_numbers(text: str) -> set:
+    """Sizes, ratings and speeds; whole numbers of 5+ digits or zero-padded ones are references"""
+    numbers = re.findall(r'\d+(?:[./]\d+)*', text)
+    return {n for n in numbers if not n.isdigit() or (len(n) <= 4 and not n.startswith('0'))}
+
+
+def find_near_duplicate(description: str, namespace: Tuple,
+                        metrics: Optional[JobMetrics] = None) -> Optional[Tuple[float, str, Dict]]:
+    """A past result for a near-identical description, if every copied value still fits"""
+    if NEAR_DUPLICATE_THRESHOLD <= 0:
+        return None
+    match = near_duplicates.find(namespace, description)
+    if match is None:
+        return None
+
+    # The same text with another size or rating is a different item
+    score, source, result = match
+    if spec_numbers(description) != spec_numbers(source) or not all(
+            is_grounded(value, description) for field, value in result.items()
+            if value and field not in INFERRED_FIELDS):
+        if metrics is not None:
+            metrics.increment('near_duplicate_rejected')
+        return None
+    return match
+
+
+def extract_tiered(extract: Callable[[str], Dict], description: str, model_name: str,
+                   fast_model: str, metrics: Optional[JobMetrics] = None) -> Dict:
+    """Extract with fast_model and escalate to model_name if validation fails"""
+    extracted = extract(fast_model)
+    matcher = get_category_matcher()
+    issues = validate_fields(extracted, description, matcher)
+    reason = next(iter(issues.values()), None) or looks_low_confidence(extracted, description, matcher)
+
+    if metrics is not None:
+        metrics.increment('tiered_rows')
+        if reason is not None:
+            metrics.increment('escalated_rows')
+            metrics.increment(f"escalated: {reason}")
+        # Updated on every tiered row so clean rows bring the rate down as well
+        metrics.set('escalation_rate', round(metrics.counter('escalated_rows') / metrics.counter('tiered_rows'), 3))
+    if reason is None:
+        return extracted
+
+    logger.info(f"Escalating to {model_name}: {reason}")
+    return extract(model_name)
+
+
+def output_record(record: Dict) -> Dict:
+    """Identifying columns of a parsed Excel row, before any fields are added"""
+    return {
+        "excel_row": record.get("excel_row"),
+        "part_number": record.get("part_number"),
+        "Vendor": record.get("vendor"),
+        "description": record.get('description', '').strip()
+    }
+
+
+def similarity_order(records: List[Dict], sparse: bool = False, preprocess: bool = False) -> List[Dict]:
+    """
+    Rows reordered so that prompts sharing the longest prefix run one after another.
+    The description comes last in the prompt, so sorting by the text that goes into
+    it puts rows of the same product next to each other; sparse prompts are grouped
+    by their field list first since it precedes the description.
+    """
+    cleaner = get_description_cleaner() if preprocess else None
+    matcher = get_category_matcher() if sparse else None
+
+    def prompt_key(record: Dict) -> Tuple[str, str]:
+        description = record.get('description', '').strip()
+        if cleaner:
+            description = cleaner.clean(description)
+        group = select_schema(description, TARGET_COLUMNS, matcher)[0] if sparse else None
+        return (group or '', ' '.join(description.upper().split()))
+
+    return sorted(records, key=prompt_key)
+
+
+class RowTask:
+    """One parsed Excel row on its way through the extraction stages"""
+
+    def __init__(self, record: Dict):
+        self.record = record
+        self.output = output_record(record)
+        self.description = self.output['description']
+        self.prompt_description = self.description
+        self.key: Optional[Tuple] = None
+        self.fields: Optional[Dict[str, str]] = None  # Set by whichever stage resolves the row
+
+    @property
+    def resolved(self) -> bool:
+        return self.fields is not None
+
+    def resolve(self, fields: Dict[str, str], **columns) -> None:
+        """Settle the row's fields; columns are extra output columns such as where they came from"""
+        self.fields = fields
+        self.output.update(columns)
+
+
+def skip_empty(task: RowTask) -> RowTask:
+    """Rows without a usable description get empty fields and never reach the model"""
+    if not task.resolved and task.description in EMPTY_DESCRIPTIONS:
+        logger.info(f"Row {task.record.get('excel_row')} - Skipped (empty description)")
+        task.resolve(create_empty_fields())
+    return task
+
+
+def preprocess_row(task: RowTask, model_name: str, metrics: Optional[JobMetrics] = None) -> RowTask:
+    """Clean the description that goes into the prompt; the output keeps the original"""
+    if task.resolved:
+        return task
+    task.prompt_description = get_description_cleaner().clean(task.description)
+    if metrics is not None:
+        metrics.increment('preprocessed_rows')
+        metrics.increment('description_tokens_raw', generation_budget.estimate_tokens(model_name, task.description))
+        metrics.increment('description_tokens_cleaned', generation_budget.estimate_tokens(model_name, task.prompt_description))
+        metrics.set('description_token_ratio', round(
+            metrics.counter('description_tokens_cleaned') / max(metrics.counter('description_tokens_raw'), 1), 3
+        ))
+    return task
+
+
+def lookup_cached(task: RowTask, model_name: str,
+                  fast_model: Optional[str] = None,
+                  sparse: bool = False,
+                  prefix_prompt: bool = True,
+                  metrics: Optional[JobMetrics] = None) -> RowTask:
+    """Resolve the row from an earlier result for the same, or a near-identical, description"""
+    if task.resolved:
+        return task
+    task.key = extraction_key(task.prompt_description, model_name, fast_model, sparse, prefix_prompt)
+    extracted = result_cache.get(task.key)
+    if extracted is not None:
+        if metrics is not None:
+            metrics.increment('cache_hits')
+        task.resolve(extracted)
+        return task
+
+    # Near duplicates are only compared with results of the same models and prompt
+    near_duplicate = find_near_duplicate(task.prompt_description, task.key[1:], metrics)
+    if near_duplicate is not None:
+        score, source, extracted = near_duplicate
+        if metrics is not None:
+            metrics.increment('near_duplicate_hits')
+        task.resolve(extracted, near_duplicate_score=round(score, 3), near_duplicate_of=source)
+    return task
+
+
+def extract_with_model(task: RowTask, model_name: str,
+                       cancel_token: Optional[CancelToken] = None,
+                       keep_alive: Optional[str] = None,
+                       metrics: Optional[JobMetrics] = None,
+                       budgeted: Optional[bool] = None,
+                       fast_model: Optional[str] = None,
+                       sparse: bool = False,
+                       prefix_prompt: bool = True) -> RowTask:
+    """
+    Send a row that is still unresolved to the model.
+    With a fast_model, rows go to it first and only escalate to model_name
+    when its answer fails validation.
+    """
+    if task.resolved:
+        return task
+
+    def record_call(model: str, latency: float, call_metrics: Dict) -> None:
+        generation_report.record_call(model, latency, call_metrics)
+        prompt_layout_report.record_call(model, latency, call_metrics)
+        if metrics is not None:
+            metrics.record_call(model, latency, call_metrics)
+
+    def record_repair(failures: Dict[str, str]) -> None:
+        if metrics is not None:
+            metrics.increment('repaired_rows')
+            for field in failures:
+                metrics.increment(f"repairs: {field}")
+
+    def record_schema(group: Optional[str]) -> None:
+        if metrics is not None:
+            metrics.increment(f"schema: {group or 'all fields'}")
+
+    try:
+        extract = partial(
+            parse_description_with_ollama,
+            task.prompt_description,
+            cancel_token=cancel_token,
+            keep_alive=keep_alive,
+            on_call=record_call,
+            budgeted=budgeted,
+            on_repair=record_repair,
+            sparse=sparse,
+            on_schema=record_schema,
+            prefix_prompt=prefix_prompt
+        )
+
+        def run() -> Dict:
+            if fast_model:
+                return extract_tiered(extract, task.prompt_description, model_name, fast_model, metrics)
+            return extract(model_name)
+
+        key = task.key or extraction_key(task.prompt_description, model_name, fast_model, sparse, prefix_prompt)
+        # An identical row may have finished since the cache was checked
+        extracted = result_cache.get(key)
+        if extracted is not None:
+            if metrics is not None:
+                metrics.increment('cache_hits')
+            task.resolve(extracted)
+            return task
+
+        extracted = run()
+        if any(extracted.values()):
+            # Failed extractions come back empty and are worth retrying next time
+            result_cache.put(key, extracted)
+            near_duplicates.add(key[1:], task.prompt_description, extracted)
+        task.resolve(extracted)
+    except ExtractionCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error on row {task.record.get('excel_row')}: {str(e)}")
+        # Continue with empty fields rather than failing
+        task.resolve(create_empty_fields())
+    return task
+
+
+def extract_coalesced(task: RowTask, extract: Callable[[], RowTask],
+                      cancel_token: Optional[CancelToken] = None,
+                      metrics: Optional[JobMetrics] = None) -> RowTask:
+    """
+    Run extract for the first of identical unresolved rows, in this job or another;
+    identical rows arriving while it runs wait for its fields instead of being
+    extracted again. They wait in the caller's thread, so only the first row has
+    to be handed to a model worker.
+    """
+    if task.resolved or task.key is None:
+        return extract()
+
+    def lead() -> Dict[str, str]:
+        extract()
+        return task.fields
+
+    fields, shared = in_flight.do(task.key, lead, cancel_token)
+    if shared:
+        if metrics is not None:
+            metrics.increment('coalesced_calls')
+        task.resolve(dict(fields))
+    return task
+
+
+def finish_record(task: RowTask) -> Dict:
+    """The row's output record with every field, empty ones included"""
+    new_record = dict(task.output)
+    new_record.update(create_empty_fields())
+    new_record.update(task.fields or {})
+    return new_record
+
+
+def extract_record(record: Dict, model_name: str,
+                   cancel_token: Optional[CancelToken] = None,
+                   keep_alive: Optional[str] = None,
+                   metrics: Optional[JobMetrics] = None,
+                   budgeted: Optional[bool] = None,
+                   fast_model: Optional[str] = None,
+                   sparse: bool = False,
+                   preprocess: bool = False,
+                   prefix_prompt: bool = True) -> Dict:
+    """
+    Run one parsed Excel row through every extraction step and return its output record.
+    preprocess cleans the description that goes into the prompt; the output keeps the original.
+    """
+    task = skip_empty(RowTask(record))
+    if preprocess:
+        preprocess_row(task, model_name, metrics)
+    lookup_cached(task, model_name, fast_model, sparse, prefix_prompt, metrics)
+    extract_coalesced(task, partial(extract_with_model, task, model_name, cancel_token, keep_alive, metrics,
+                                    budgeted, fast_model, sparse, prefix_prompt),
+                      cancel_token, metrics)
+    return finish_record(task)
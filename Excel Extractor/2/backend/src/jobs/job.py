@@ -0,0 +1,71 @@
+import logging
+import time
+from threading import Condition, Event, Lock
+from typing import Dict, List, Optional
+from src.ai.cancellation import CancelToken
+from src.jobs.job_metrics import JobMetrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """State of a single extraction job, shared between the worker and the API"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = 'running'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.output_name: Optional[str] = None  # File name the processed workbook is sent as
+        self.cancel_token = CancelToken()
+        self.done_event = Event()  # Set once the (partial) output has been written
+        self.progress = {"current": 0, "total": 0}
+        self.metrics = JobMetrics()  # Per-job measurements such as scheduler wait time
+        self._results: List[Dict] = []
+        self._lock = Lock()
+        self._rows_changed = Condition(self._lock)
+
+    def add_result(self, record: Dict) -> None:
+        with self._lock:
+            self._results.append(record)
+            self._rows_changed.notify_all()
+
+    def snapshot(self) -> List[Dict]:
+        """Copy of the rows completed so far, safe to read while the job runs"""
+        with self._lock:
+            return list(self._results)
+
+    def rows_since(self, offset: int, timeout: float) -> List[Dict]:
+        """Rows completed after offset, waiting up to timeout for new ones"""
+        with self._lock:
+            if offset >= len(self._results) and not self.is_finished:
+                self._rows_changed.wait(timeout)
+            return self._results[offset:]
+
+    @property
+    def completed_rows(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancel_token.is_cancelled
+
+    def cancel(self) -> None:
+        """Stop the job and abort any generation currently in flight"""
+        self.cancel_token.cancel()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished_at is not None
+
+    def finish(self, status: str) -> None:
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+            self._rows_changed.notify_all()
+        self.done_event.set()
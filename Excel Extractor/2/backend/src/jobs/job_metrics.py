@@ -0,0 +1,130 @@
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ModelCallStats:
+    """Running totals for the model calls of one model"""
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.truncated = 0
+        self.repair_calls = 0
+        self.repair_tokens = 0
+        self.latency = 0.0
+        self.load = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prompt_eval = 0.0
+
+    def add(self, latency: float, call_metrics: Dict[str, Any]) -> None:
+        self.calls += 1
+        # Retries belong to the row of the first attempt
+        if not call_metrics.get('retry'):
+            self.rows += 1
+        if call_metrics.get('truncated'):
+            self.truncated += 1
+        if call_metrics.get('repair'):
+            self.repair_calls += 1
+            self.repair_tokens += call_metrics.get('prompt_tokens', 0) + call_metrics.get('completion_tokens', 0)
+        self.latency += latency
+        self.load += call_metrics.get('load_seconds', 0.0)
+        self.prompt_tokens += call_metrics.get('prompt_tokens', 0)
+        self.completion_tokens += call_metrics.get('completion_tokens', 0)
+        self.prompt_eval += call_metrics.get('prompt_eval_seconds', 0.0)
+
+    def summary(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        rows = self.rows or 1
+        return {
+            'calls': self.calls,
+            'rows': self.rows,
+            'truncated_calls': self.truncated,
+            'repair_calls': self.repair_calls,
+            'repair_tokens': self.repair_tokens,
+            'avg_latency_seconds': round(self.latency / calls, 3),
+            # Steady-state latency leaves out time the server spent loading the model
+            'avg_steady_latency_seconds': round((self.latency - self.load) / calls, 3),
+            'avg_prompt_tokens': round(self.prompt_tokens / calls, 1),
+            'avg_completion_tokens': round(self.completion_tokens / calls, 1),
+            'avg_prompt_eval_seconds': round(self.prompt_eval / calls, 3),
+            'avg_prompt_eval_per_row_seconds': round(self.prompt_eval / rows, 3),
+            'avg_tokens_per_row': round((self.prompt_tokens + self.completion_tokens) / rows, 1),
+            'avg_latency_per_row_seconds': round(self.latency / rows, 3)
+        }
+
+
+class JobMetrics:
+    """Thread-safe measurements of one job: named values, counters and per-model call stats"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._values: Dict[str, Any] = {}
+        self._counters: Dict[str, int] = {}
+        self._models: Dict[str, ModelCallStats] = {}
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def record_call(self, model: str, latency: float, call_metrics: Dict[str, Any]) -> None:
+        """Add one model call with the counters reported by the inference server"""
+        with self._lock:
+            self._models.setdefault(model, ModelCallStats()).add(latency, call_metrics)
+
+    def __bool__(self) -> bool:
+        with self._lock:
+            return bool(self._values or self._counters or self._models)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            summary = dict(self._values)
+            summary['counters'] = dict(self._counters)
+            summary['models'] = {model: calls.summary() for model, calls in self._models.items()}
+            return summary
+
+
+class GenerationReport:
+    """
+    Service-wide model call stats split into modes by mode_of(call_metrics),
+    so tokens and latency per row can be compared before and after a setting changes
+    """
+
+    def __init__(self, mode_of: Callable[[Dict[str, Any]], str]):
+        self.mode_of = mode_of
+        self._lock = Lock()
+        self._models: Dict[str, Dict[str, ModelCallStats]] = {}
+
+    def record_call(self, model: str, latency: float, call_metrics: Dict[str, Any]) -> None:
+        mode = self.mode_of(call_metrics)
+        with self._lock:
+            modes = self._models.setdefault(model, {})
+            modes.setdefault(mode, ModelCallStats()).add(latency, call_metrics)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model: {mode: stats.summary() for mode, stats in modes.items()}
+                for model, modes in self._models.items()
+            }
+
+
+# Shared by every job for the lifetime of the service: whether the generation budget applied,
+# and whether the prompt put its static prefix first
+generation_report = GenerationReport(lambda m: 'budgeted' if m.get('budgeted') else 'unbounded')
+prompt_layout_report = GenerationReport(lambda m: 'prefix' if m.get('prefix_prompt') else 'inline')
@@ -0,0 +1,75 @@
+import logging
+import pandas as pd
+from collections import defaultdict, deque
+from typing import IO, Deque, Dict, List, Optional, Tuple, Union
+from src.ai.ollama_handler import TARGET_COLUMNS
+from src.ai.field_validation import validate_fields
+from src.jobs.extraction import EMPTY_DESCRIPTIONS
+from src.matching.category_matcher import CategoryMatcher
+from src.storage.product_master import normalize_key
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def load_previous_output(source: Union[str, IO]) -> List[Dict[str, str]]:
+    """Rows of a processed output workbook, every cell as a string"""
+    df = pd.read_excel(source, dtype=str, engine='openpyxl').fillna('')
+    missing = [column for column in ('part_number', 'description') if column not in df.columns]
+    if missing:
+        raise ValueError(f"Not a processed workbook, missing columns: {', '.join(missing)}")
+    return df.to_dict('records')
+
+
+def _row_key(vendor: Optional[str], part_number: Optional[str]) -> Tuple[str, str]:
+    return normalize_key(vendor), normalize_key(part_number)
+
+
+def rerun_reason(record: Dict, previous: Optional[Dict[str, str]],
+                 matcher: Optional[CategoryMatcher] = None) -> Optional[str]:
+    """Why a row has to go to the model again, or None to carry its previous result over"""
+    if previous is None:
+        return 'new row'
+    description = record.get('description', '').strip()
+    if ' '.join(description.split()) != ' '.join(previous.get('description', '').split()):
+        return 'description changed'
+    if description in EMPTY_DESCRIPTIONS:
+        return None
+    fields = {field: previous.get(field, '') for field in TARGET_COLUMNS}
+    # Failed and timed out rows come back with every field empty
+    if not any(value.strip() for value in fields.values()):
+        return 'no fields'
+    if validate_fields(fields, description, matcher, grounding=False):
+        return 'invalid fields'
+    return None
+
+
+def plan_reprocessing(records: List[Dict], previous_rows: List[Dict[str, str]],
+                      matcher: Optional[CategoryMatcher] = None
+                      ) -> Tuple[List[Tuple[Dict, Dict[str, str]]], List[Tuple[Dict, str]]]:
+    """
+    Split parsed rows into those whose previous result can be carried over and
+    those that need the model. Rows are matched to the previous output by vendor
+    plus part number, in sheet order when a part appears more than once. Previous
+    rows without a vendor, as in outputs that predate the Vendor column, match on
+    part number alone.
+    Returns ([(record, previous fields)], [(record, reason)]).
+    """
+    previous_by_key: Dict[Tuple[str, str], Deque[Dict[str, str]]] = defaultdict(deque)
+    for row in previous_rows:
+        previous_by_key[_row_key(row.get('Vendor'), row.get('part_number'))].append(row)
+
+    carried, rerun = [], []
+    for record in records:
+        vendor_key, part_key = _row_key(record.get('vendor'), record.get('part_number'))
+        matches = previous_by_key.get((vendor_key, part_key)) or previous_by_key.get(('', part_key))
+        previous = matches.popleft() if matches else None
+        reason = rerun_reason(record, previous, matcher)
+        if reason:
+            rerun.append((record, reason))
+        else:
+            carried.append((record, {field: previous.get(field, '') for field in TARGET_COLUMNS}))
+    return carried, rerun
@@ -0,0 +1,148 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class _JobQueue:
+    """Pending rows of one job plus its fair-queuing and wait-time state"""
+
+    def __init__(self, total_rows: int, weight: float):
+        self.total_rows = total_rows
+        self.weight = weight
+        self.tasks: Deque[Tuple[Callable[[], Any], Future, float]] = deque()
+        self.virtual_finish = 0.0
+        self.dispatched = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'total_rows': self.total_rows,
+            'weight': self.weight,
+            'queued_rows': len(self.tasks),
+            'dispatched_rows': self.dispatched,
+            'avg_wait_seconds': round(self.wait_total / self.dispatched, 3) if self.dispatched else 0.0,
+            'max_wait_seconds': round(self.wait_max, 3)
+        }
+
+
+class RowScheduler:
+    """
+    Shared pool of workers that runs rows from every active job.
+    Rows are interleaved with weighted fair queuing (start-time fair queuing):
+    each job advances its own virtual clock by 1/weight per dispatched row and
+    the job with the earliest virtual finish goes next. Jobs no larger than
+    small_job_rows can optionally jump ahead of everything else.
+    """
+
+    def __init__(self, num_workers: int, small_jobs_first: bool = False,
+                 small_job_rows: int = 100):
+        self.num_workers = num_workers
+        self.small_jobs_first = small_jobs_first
+        self.small_job_rows = small_job_rows
+        self._cond = Condition()
+        self._jobs: Dict[str, _JobQueue] = {}
+        self._virtual_time = 0.0
+        self._busy_workers = 0
+
+        for idx in range(num_workers):
+            Thread(target=self._worker, name=f"row-worker-{idx}", daemon=True).start()
+
+    def register_job(self, job_id: str, total_rows: int, priority: float = 1.0) -> None:
+        with self._cond:
+            self._jobs[job_id] = _JobQueue(total_rows, max(float(priority), 0.1))
+
+    def submit(self, job_id: str, fn: Callable[[], Any]) -> Future:
+        """Queue one row of a registered job; the future holds fn's result"""
+        future = Future()
+        with self._cond:
+            self._jobs[job_id].tasks.append((fn, future, time.time()))
+            self._cond.notify()
+        return future
+
+    def cancel_job(self, job_id: str) -> int:
+        """Drop the job's queued rows; rows already running are left to their cancel token"""
+        with self._cond:
+            queue = self._jobs.get(job_id)
+            if queue is None:
+                return 0
+            dropped = 0
+            while queue.tasks:
+                _, future, _ = queue.tasks.popleft()
+                # Like an executor, notify waiters such as as_completed() of the cancellation
+                future.cancel()
+                future.set_running_or_notify_cancel()
+                dropped += 1
+        if dropped:
+            logger.info(f"Dropped {dropped} queued rows of job {job_id}")
+        return dropped
+
+    def unregister_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Forget a finished job and return its final wait-time stats"""
+        self.cancel_job(job_id)
+        with self._cond:
+            queue = self._jobs.pop(job_id, None)
+            return queue.stats() if queue else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'workers': self.num_workers,
+                'busy_workers': self._busy_workers,
+                'small_jobs_first': self.small_jobs_first,
+                'jobs': {job_id: queue.stats() for job_id, queue in self._jobs.items()}
+            }
+
+    def _next_task(self) -> Optional[Tuple[Callable[[], Any], Future]]:
+        best_key, best_queue, best_start = None, None, 0.0
+        for queue in self._jobs.values():
+            if not queue.tasks:
+                continue
+            start = max(queue.virtual_finish, self._virtual_time)
+            finish = start + 1.0 / queue.weight
+            small = self.small_jobs_first and queue.total_rows <= self.small_job_rows
+            key = (0 if small else 1, finish)
+            if best_key is None or key < best_key:
+                best_key, best_queue, best_start = key, queue, start
+
+        if best_queue is None:
+            return None
+
+        fn, future, enqueued_at = best_queue.tasks.popleft()
+        best_queue.virtual_finish = best_key[1]
+        self._virtual_time = best_start
+
+        wait = time.time() - enqueued_at
+        best_queue.dispatched += 1
+        best_queue.wait_total += wait
+        best_queue.wait_max = max(best_queue.wait_max, wait)
+        return fn, future
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+                self._busy_workers += 1
+
+            fn, future = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn())
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._busy_workers -= 1
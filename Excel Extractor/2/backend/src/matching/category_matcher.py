@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import logging
+from difflib import get_close_matches
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Matching logic ported from the category matcher in version 3 (src/idek.py)
+
+# Spelled-out sizes, so "one half" => "1/2"
+SIZE_SYNONYMS = {
+    "1/4":   ["1/4", "quarter", "one quarter"],
+    "3/8":   ["3/8", "three eighths"],
+    "1/2":   ["1/2", "one half", "half inch"],
+    "3/4":   ["3/4", "three quarter", "three fourths"],
+    "1":     ["1", "one"],
+    "1-1/2": ["1-1/2", "one and one half", "1.5"],
+    "2":     ["2", "two"],
+    "3":     ["3", "three"],
+    "4":     ["4", "four"],
+    "6":     ["6", "six"],
+    "8":     ["8", "eight"],
+    "10":    ["10", "ten"],
+    "12":    ["12", "twelve"],
+    "16":    ["16", "sixteen"],
+    "20":    ["20", "twenty"],
+    "24":    ["24", "twenty four"]
+}
+
+# Output field -> key of its bucket list in categories.json
+BUCKET_FIELDS = {
+    "Size": "sizes",
+    "Flange Class": "flangeClasses",
+    "Pipe Class": "pipeClasses",
+    "Connection Type 1": "connectionTypes",
+    "Connection Type 2": "connectionTypes"
+}
+
+
+def normalize_text(text) -> str:
+    """Normalize text while preserving fractional sizes"""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+
+    # Keep common fractional sizes intact (don't split them)
+    fractions = re.findall(r'\b\d{1,2}/\d{1,2}\b', text)
+
+    # Remove all punctuation except "/"
+    text = re.sub(r'[^\w\s/]', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    # Restore extracted fractions into the cleaned text
+    for frac in fractions:
+        text = text.replace(frac.replace("/", " "), frac)
+
+    return text
+
+
+def create_subgroup_mapping(buckets: Dict) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Map subgroups to product groups, and normalized subgroup text to subgroups"""
+    subgroup_to_group = {}
+    subgroup_lookup = {}
+
+    for product_group, data in buckets.get('productGroups', {}).items():
+        for subgroup in data.get('subgroups', []):
+            subgroup_to_group[subgroup] = product_group
+
+            norm_sg = normalize_text(subgroup)
+            subgroup_lookup[norm_sg] = subgroup
+
+            # If a dash exists, also map the text after it
+            if "-" in norm_sg:
+                subgroup_lookup[norm_sg.split("-", 1)[1].strip()] = subgroup
+
+            # Also map each word of at least 4 characters
+            for word in norm_sg.split():
+                if len(word) >= 4:
+                    subgroup_lookup.setdefault(word, subgroup)
+
+    return subgroup_to_group, subgroup_lookup
+
+
+def build_value_lookup(values: List[str]) -> Dict[str, str]:
+    return {normalize_text(v): v for v in values}
+
+
+def build_size_lookup(sizes: List[str]) -> Dict[str, str]:
+    """Normalized size or synonym -> canonical size"""
+    lookup = {}
+    for canonical_size in sizes:
+        for synonym in SIZE_SYNONYMS.get(canonical_size, [canonical_size]):
+            lookup[normalize_text(synonym)] = canonical_size
+    return lookup
+
+
+def find_subgroup_matches(description: str, subgroup_lookup: Dict[str, str],
+                          fuzzy_cutoff: float = 0.6) -> List[str]:
+    """All subgroups named in a description: word matches first, fuzzy matches otherwise"""
+    norm_desc = normalize_text(description)
+    if not norm_desc:
+        return []
+
+    matches = []
+    # Longest words first, so the most specific subgroup leads
+    for word in sorted(norm_desc.split(), key=len, reverse=True):
+        subgroup = subgroup_lookup.get(word)
+        if subgroup and subgroup not in matches:
+            matches.append(subgroup)
+
+    if not matches:
+        for key in get_close_matches(norm_desc, subgroup_lookup.keys(), n=10, cutoff=fuzzy_cutoff):
+            if subgroup_lookup[key] not in matches:
+                matches.append(subgroup_lookup[key])
+    return matches
+
+
+def find_attribute_matches(value: str, lookup: Dict[str, str],
+                           fuzzy_cutoff: float = 0.6) -> List[str]:
+    """Match an attribute value against a bucket lookup, keeping fractions intact"""
+    norm_value = normalize_text(value)
+    if not norm_value:
+        return []
+
+    if norm_value in lookup:
+        return [lookup[norm_value]]
+
+    matches = []
+    for word in norm_value.split():
+        if word in lookup and lookup[word] not in matches:
+            matches.append(lookup[word])
+
+    if not matches:
+        for key in get_close_matches(norm_value, lookup.keys(), n=5, cutoff=fuzzy_cutoff):
+            if lookup[key] not in matches:
+                matches.append(lookup[key])
+    return matches
+
+
+class CategoryMatcher:
+    """Product group and attribute buckets from categories.json"""
+
+    def __init__(self, buckets: Dict, fuzzy_cutoff: float = 0.6):
+        self.buckets = buckets
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.subgroup_to_group, self.subgroup_lookup = create_subgroup_mapping(buckets)
+        self.field_lookups: Dict[str, Dict[str, str]] = {}
+        for field, key in BUCKET_FIELDS.items():
+            values = buckets.get(key, [])
+            if values:
+                self.field_lookups[field] = build_size_lookup(values) if key == 'sizes' else build_value_lookup(values)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CategoryMatcher':
+        try:
+            with open(path, 'r') as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            logger.warning(f"No categories file at {path}, bucket checks are disabled")
+        except Exception as e:
+            logger.error(f"Error loading categories file {path}: {str(e)}")
+        return cls({})
+
+    def match_subgroups(self, description: str) -> List[str]:
+        return find_subgroup_matches(description, self.subgroup_lookup, self.fuzzy_cutoff)
+
+    def product_group(self, description: str) -> Optional[str]:
+        """Product group of the first subgroup named in the description"""
+        subgroups = self.match_subgroups(description)
+        return self.subgroup_to_group.get(subgroups[0]) if subgroups else None
+
+    def has_buckets(self, field: str) -> bool:
+        return field in self.field_lookups
+
+    def match_attribute(self, field: str, value: str) -> List[str]:
+        lookup = self.field_lookups.get(field)
+        if not lookup:
+            return []
+        return find_attribute_matches(value, lookup, self.fuzzy_cutoff)
+
+
+_matcher: Optional[CategoryMatcher] = None
+_matcher_lock = Lock()
+
+
+def get_category_matcher() -> CategoryMatcher:
+    """Shared matcher for the categories file named by CATEGORIES_FILE"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = CategoryMatcher.from_file(os.getenv('CATEGORIES_FILE', 'categories.json'))
+        return _matcher
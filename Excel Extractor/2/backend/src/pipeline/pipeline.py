@@ -0,0 +1,168 @@
+import logging
+import time
+from concurrent.futures import CancelledError
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from src.ai.cancellation import ExtractionCancelled
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Marks the end of the input; passed on once every worker of a stage has seen it
+_END = object()
+
+
+class StageStats:
+    """Where the workers of one stage spent their time"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = Lock()
+        self.items = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0.0  # Running the stage function
+        self.idle = 0.0  # Waiting for input from the stage before
+        self.blocked = 0.0  # Waiting for room in the queue of the stage after
+
+    def add(self, busy: float = 0.0, idle: float = 0.0, blocked: float = 0.0,
+            items: int = 0, dropped: int = 0, errors: int = 0) -> None:
+        with self._lock:
+            self.busy += busy
+            self.idle += idle
+            self.blocked += blocked
+            self.items += items
+            self.dropped += dropped
+            self.errors += errors
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'items': self.items,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'busy_seconds': round(self.busy, 3),
+                'idle_seconds': round(self.idle, 3),
+                'blocked_seconds': round(self.blocked, 3),
+                # Share of the workers' time spent working; the bottleneck is the busiest stage
+                'utilization': round(self.busy / (self.workers * elapsed), 3) if elapsed > 0 else 0.0
+            }
+
+
+class Stage:
+    """
+    One step of a pipeline. fn(item) returns the item for the next stage,
+    or None to drop it; workers threads take items from a bounded input queue,
+    so a slow stage makes the ones before it wait instead of piling up rows.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = 32):
+        self.name = name
+        self.fn = fn
+        self.workers = max(int(workers), 1)
+        self.queue: Queue = Queue(maxsize=max(int(queue_size), 1))
+        self.stats = StageStats(self.workers)
+        self._running = 0
+        self._lock = Lock()
+
+
+class Pipeline:
+    """
+    Stages joined by bounded queues, each with its own number of workers.
+    The reader is the thread calling run(), which feeds the source into the
+    first stage. Items a stage drops, or fails on, do not reach later stages.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.reader = StageStats(1)
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def run(self, source: Iterable[Any]) -> None:
+        """Feed every item of source through the stages and wait until the last stage is done"""
+        self._started = time.time()
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            downstream = self.stages[idx + 1] if idx + 1 < len(self.stages) else None
+            stage._running = stage.workers
+            for worker in range(stage.workers):
+                thread = Thread(target=self._work, args=(stage, downstream),
+                                name=f"{stage.name}-{worker}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        items = iter(source)
+        while True:
+            started = time.time()
+            item = next(items, _END)
+            read = time.time()
+            first.queue.put(item)
+            self.reader.add(busy=read - started, blocked=time.time() - read,
+                            items=0 if item is _END else 1)
+            if item is _END:
+                break
+
+        for thread in threads:
+            thread.join()
+        self._finished = time.time()
+
+    def _work(self, stage: Stage, downstream: Optional[Stage]) -> None:
+        while True:
+            waited = time.time()
+            item = stage.queue.get()
+            started = time.time()
+            stage.stats.add(idle=started - waited)
+
+            if item is _END:
+                # Let the other workers of this stage see the end too
+                stage.queue.put(_END)
+                with stage._lock:
+                    stage._running -= 1
+                    last = stage._running == 0
+                if last and downstream is not None:
+                    downstream.queue.put(_END)
+                return
+
+            try:
+                result = stage.fn(item)
+                errors = 0
+            except ExtractionCancelled:
+                result, errors = None, 0
+            except CancelledError:
+                # A future cancelled without the job being stopped is a lost row, not a stop
+                logger.error(f"Stage {stage.name} lost a row to a cancelled future")
+                result, errors = None, 1
+            except Exception as e:
+                logger.error(f"Stage {stage.name} failed: {str(e)}")
+                result, errors = None, 1
+            finished = time.time()
+
+            if result is None:
+                stage.stats.add(busy=finished - started, dropped=1, errors=errors)
+                continue
+            if downstream is not None:
+                downstream.queue.put(result)
+            stage.stats.add(busy=finished - started, blocked=time.time() - finished, items=1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage busy, idle and blocked time so far, reader first"""
+        if self._started is None:
+            return {}
+        elapsed = (self._finished or time.time()) - self._started
+        stages = {'reader': self.reader.summary(elapsed)}
+        stages.update((stage.name, stage.stats.summary(elapsed)) for stage in self.stages)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda name: stages[name]['utilization'])
+        }
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import logging
+from threading import Lock
+from typing import Dict, List, Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Windows-1252 quotes read as latin-1 (as in the training formatter's clean_text),
+# their UTF-8 mojibake, and symbols worth keeping in ASCII form
+CHARACTER_FIXES = {
+    '\u0093': '"', '\u0094': '"', '\u0092': "'", '\u0091': "'",
+    'â€œ': '"', 'â€\x9d': '"', 'â€™': "'", 'â€˜': "'", 'Â°': ' deg',
+    '“': '"', '”': '"', '″': '"', '‘': "'", '’': "'", '′': "'",
+    '°': ' deg', '½': '1/2', '¼': '1/4', '¾': '3/4', '–': '-', '—': '-'
+}
+
+# Text that never helps extraction: warranties, guards, notes and customer reference lists
+DEFAULT_STRIP_PATTERNS = [
+    r'\b\d+[- ]YEAR WARRANTY\b',
+    r'\bOSHA APPROVED (?:BELT )?GUARD\b',
+    r'\bREFERENCE THE TECHNICAL DATA PACKET\b[^.]*\.?',
+    r'\bAND ALL NECESSARY SAFETY\b[^.]*',
+    # Reference lists start at their marker, or at the first number; the word before them stays
+    r'\bREF(?:ERENCE)?S?\b[.:#]*\s*\d+(?:-\d+)?(?:\s*(?:,|AND|THRU)\s*\d+(?:-\d+)?)*',
+    r'\b\d{5}-\d{2}(?:\s*(?:,|AND|THRU)\s*\d{5}-\d{2})+'
+]
+
+# Numbers and rating words; a part of the description with any of them is never cut
+SPEC_TOKEN = re.compile(
+    r'\d|\b(?:NEMA|TEFC|TENV|ODP|XP|EXP|NACE|API|ASME|ANSI|UL|CSA|ATEX|CLASS|DIV|DIVISION|'
+    r'PHASE|PH|HP|RPM|VAC|VDC|HZ|PSI|PSIG|GPM|FLANGED?|NPT|SS|CS)\b',
+    re.IGNORECASE
+)
+
+DEFAULT_EXPANSIONS = {
+    r'\bW/(?=\s|\w)': 'with '
+}
+
+
+class DescriptionCleaner:
+    """
+    Shrinks a description before it goes into a prompt: fixes mojibake,
+    expands or strips known phrases and normalizes whitespace. An optional
+    max_chars (0, the default, for no cap) drops trailing parts without
+    numbers or spec words once the text is too long.
+    Patterns are regular expressions matched case-insensitively.
+    """
+
+    def __init__(self, strip_patterns: Optional[List[str]] = None,
+                 expansions: Optional[Dict[str, str]] = None,
+                 max_chars: int = 0):
+        self.strip_patterns = [re.compile(p, re.IGNORECASE) for p in (strip_patterns or [])]
+        self.expansions = [(re.compile(p, re.IGNORECASE), r) for p, r in (expansions or {}).items()]
+        self.max_chars = max_chars
+
+    @classmethod
+    def from_file(cls, path: Optional[str], max_chars: int = 0) -> 'DescriptionCleaner':
+        """Rules from a JSON file with strip_patterns, expansions and max_chars, or the defaults"""
+        rules = {}
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    rules = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading preprocessing rules {path}: {str(e)}")
+        return cls(
+            strip_patterns=rules.get('strip_patterns', DEFAULT_STRIP_PATTERNS),
+            expansions=rules.get('expansions', DEFAULT_EXPANSIONS),
+            max_chars=rules.get('max_chars', max_chars)
+        )
+
+    def clean(self, text: str) -> str:
+        for bad, good in CHARACTER_FIXES.items():
+            text = text.replace(bad, good)
+        # Drop whatever else is not printable ASCII, like clean_text
+        text = re.sub(r'[^\x20-\x7E]', ' ', text)
+
+        for pattern, replacement in self.expansions:
+            text = pattern.sub(replacement, text)
+        for pattern in self.strip_patterns:
+            text = pattern.sub(' ', text)
+
+        text = re.sub(r'\s+', ' ', text)
+        # Punctuation orphaned by removed phrases; a dot before a digit is a decimal point
+        text = re.sub(r'\s+([.,;])(?!\d)', r'\1', text)
+        text = re.sub(r'([.,;])(?:\s*[.,;](?!\d))+', r'\1', text).strip(' .,;')
+        return self.truncate(text)
+
+    def truncate(self, text: str) -> str:
+        """
+        Cap the length after stripping by dropping sentences and clauses past
+        max_chars, but only those without spec data; the cap is soft, so text
+        that carries numbers or ratings is kept however long it gets.
+        """
+        if not self.max_chars or len(text) <= self.max_chars:
+            return text
+        parts = re.split(r'(?<=[.;])\s+(?!\d)', text)
+        kept = []
+        length = 0
+        for part in parts:
+            if length + len(part) <= self.max_chars or SPEC_TOKEN.search(part):
+                kept.append(part)
+                length += len(part) + 1
+        return ' '.join(kept)
+
+
+_cleaner: Optional[DescriptionCleaner] = None
+_cleaner_lock = Lock()
+
+
+def get_description_cleaner() -> DescriptionCleaner:
+    """Shared cleaner; PREPROCESS_RULES names a JSON rules file, MAX_DESCRIPTION_CHARS (off by default) caps length"""
+    global _cleaner
+    with _cleaner_lock:
+        if _cleaner is None:
+            _cleaner = DescriptionCleaner.from_file(
+                os.getenv('PREPROCESS_RULES'),
+                max_chars=int(os.getenv('MAX_DESCRIPTION_CHARS', '0'))
+            )
+        return _cleaner
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+from threading import Lock
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request at a time while a chunk streams in
+READ_BLOCK = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """Raised when a chunk or upload cannot be accepted; status is the HTTP status to answer with"""
+
+    def __init__(self, reason: str, status: int = 400):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+
+class UploadSession:
+    """A chunked upload being assembled in memory, chunk by chunk in order"""
+
+    def __init__(self, upload_id: str, filename: str, size: int, chunk_size: int,
+                 sha256: Optional[str] = None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.sha256 = sha256.lower() if sha256 else None
+        self.buffer = bytearray()
+        self.chunk_hashes: List[str] = []
+        self.digest = hashlib.sha256()  # Of everything received so far
+        self.lock = Lock()
+
+    @property
+    def total_chunks(self) -> int:
+        return max(-(-self.size // self.chunk_size), 1)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'upload_id': self.upload_id,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'total_chunks': self.total_chunks,
+            'received_chunks': len(self.chunk_hashes),
+            'received_bytes': len(self.buffer),
+            'complete': False
+        }
+
+
+class ChunkedUploads:
+    """
+    Resumable uploads sent as numbered chunks of chunk_size bytes.
+    Chunks are hashed and appended to the assembly buffer as they stream in;
+    a client that lost its connection asks for the status and continues with
+    the first chunk that is missing. Abandoned sessions are dropped by the
+    storage manager through discard().
+    """
+
+    def __init__(self, chunk_size: int = 8 * 1024 * 1024, max_upload_bytes: int = 500 * 1024 * 1024):
+        self.chunk_size = chunk_size
+        self.max_upload_bytes = max_upload_bytes
+        self._lock = Lock()
+        self._sessions: Dict[str, UploadSession] = {}
+
+    def start(self, upload_id: str, filename: str, size: int, sha256: Optional[str] = None) -> UploadSession:
+        if size <= 0:
+            raise UploadRejected('Upload size must be positive')
+        if size > self.max_upload_bytes:
+            raise UploadRejected(f'Upload exceeds {self.max_upload_bytes} bytes', 413)
+        session = UploadSession(upload_id, filename, size, self.chunk_size, sha256)
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        with self._lock:
+            return self._sessions.get(upload_id)
+
+    def write_chunk(self, upload_id: str, index: int, stream: IO[bytes],
+                    sha256: Optional[str] = None) -> UploadSession:
+        """Append chunk index, read from stream; a repeat of a received chunk is accepted if it matches"""
+        session = self.get(upload_id)
+        if session is None:
+            raise UploadRejected('Unknown upload', 404)
+
+        with session.lock:
+            received = len(session.chunk_hashes)
+            if index < received:
+                # The chunk arrived but its response was lost
+                if sha256 and sha256.lower() != session.chunk_hashes[index]:
+                    raise UploadRejected(f'Chunk {index} differs from the one already received', 409)
+                return session
+            if index > received:
+                raise UploadRejected(f'Expected chunk {received}', 409)
+
+            start = len(session.buffer)
+            expected = min(session.chunk_size, session.size - start)
+            chunk_digest = hashlib.sha256()
+            file_digest = session.digest.copy()
+            while len(session.buffer) - start <= expected:
+                block = stream.read(READ_BLOCK)
+                if not block:
+                    break
+                session.buffer += block
+                chunk_digest.update(block)
+                file_digest.update(block)
+
+            length = len(session.buffer) - start
+            reason = None
+            if length != expected:
+                reason = f'Chunk {index} must be {expected} bytes, got {length}'
+            elif sha256 and chunk_digest.hexdigest() != sha256.lower():
+                reason = f'Chunk {index} does not match its hash'
+            if reason:
+                # Drop what was written so the chunk can be sent again
+                del session.buffer[start:]
+                raise UploadRejected(reason, 422)
+
+            session.digest = file_digest
+            session.chunk_hashes.append(chunk_digest.hexdigest())
+            return session
+
+    def finish(self, upload_id: str) -> Tuple[UploadSession, bytes, str]:
+        """Close a fully received upload: (session, bytes, SHA-256 of the whole file)"""
+        session = self.get(upload_id)
+        if session is None:
+            raise UploadRejected('Unknown upload', 404)
+        with session.lock:
+            if len(session.buffer) != session.size:
+                raise UploadRejected(f'Received {len(session.buffer)} of {session.size} bytes', 409)
+            fingerprint = session.digest.hexdigest()
+            if session.sha256 and fingerprint != session.sha256:
+                raise UploadRejected('Upload does not match its hash', 422)
+            data = bytes(session.buffer)
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        return session, data, fingerprint
+
+    def discard(self, upload_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(upload_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': sum(len(s.buffer) for s in self._sessions.values())
+            }
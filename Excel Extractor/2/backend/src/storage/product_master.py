@@ -0,0 +1,147 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    vendor_key TEXT NOT NULL,
+    part_key TEXT NOT NULL,
+    vendor TEXT,
+    part_number TEXT,
+    description TEXT,
+    extracted TEXT,
+    extracted_model TEXT,
+    extracted_at REAL,
+    approved TEXT,
+    approved_by TEXT,
+    approved_at REAL,
+    PRIMARY KEY (vendor_key, part_key)
+)
+"""
+
+
+def normalize_key(value: Optional[str]) -> str:
+    return ' '.join((value or '').upper().split())
+
+
+class ProductMaster:
+    """
+    SQLite store of known parts keyed by vendor plus part number.
+    Each part keeps its last extraction and, once imported from a corrected
+    output workbook, a human-approved version that takes precedence.
+    The database is created on first use, so importing the app touches no files.
+    """
+
+    def __init__(self, db_path: str, fields: List[str]):
+        self.db_path = Path(db_path)
+        self.fields = fields
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The connection, opened and migrated on first use; callers hold _lock"""
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    def _fields_of(self, record: Dict[str, Any]) -> Dict[str, str]:
+        return {field: str(record.get(field) or '') for field in self.fields}
+
+    def lookup_many(self, records: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str], Tuple[str, Dict[str, str], str]]:
+        """
+        Known parts among the records, one indexed lookup each.
+        Returns (vendor_key, part_key) -> (source, fields, description), source being
+        'approved' or 'extracted'; description is the one the fields were taken from.
+        Parts stored without a vendor, e.g. imported from outputs that predate the
+        Vendor column, match any vendor with the same part number.
+        """
+        keys = {(normalize_key(r.get('vendor')), normalize_key(r.get('part_number')))
+                for r in records if normalize_key(r.get('part_number'))}
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT approved, extracted, description FROM products WHERE vendor_key = ? AND part_key = ?", key
+                ).fetchone()
+                if row is None and key[0]:
+                    row = self._conn.execute(
+                        "SELECT approved, extracted, description FROM products WHERE vendor_key = '' AND part_key = ?",
+                        (key[1],)
+                    ).fetchone()
+                if row is None:
+                    continue
+                approved, extracted, description = row
+                if approved:
+                    found[key] = ('approved', json.loads(approved), description or '')
+                elif extracted:
+                    found[key] = ('extracted', json.loads(extracted), description or '')
+        return found
+
+    def record_extractions(self, records: List[Dict[str, Any]], model: str) -> int:
+        """Remember the latest extraction of every record that has a part number"""
+        now = time.time()
+        rows = [
+            (normalize_key(r.get('Vendor')), normalize_key(r.get('part_number')), r.get('Vendor'),
+             r.get('part_number'), r.get('description'), json.dumps(self._fields_of(r)), model, now)
+            for r in records if normalize_key(r.get('part_number'))
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO products (vendor_key, part_key, vendor, part_number, description,
+                                         extracted, extracted_model, extracted_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (vendor_key, part_key) DO UPDATE SET
+                       description = excluded.description,
+                       extracted = excluded.extracted,
+                       extracted_model = excluded.extracted_model,
+                       extracted_at = excluded.extracted_at""",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def import_approved(self, records: List[Dict[str, Any]], approved_by: str) -> int:
+        """Store human-approved fields, e.g. the rows of a corrected output workbook"""
+        now = time.time()
+        rows = [
+            (normalize_key(r.get('Vendor')), normalize_key(r.get('part_number')), r.get('Vendor'),
+             r.get('part_number'), r.get('description'), json.dumps(self._fields_of(r)), approved_by, now)
+            for r in records if normalize_key(r.get('part_number'))
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO products (vendor_key, part_key, vendor, part_number, description,
+                                         approved, approved_by, approved_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (vendor_key, part_key) DO UPDATE SET
+                       approved = excluded.approved,
+                       approved_by = excluded.approved_by,
+                       approved_at = excluded.approved_at""",
+                rows
+            )
+            self._conn.commit()
+        logger.info(f"Imported {len(rows)} approved parts from {approved_by}")
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total, approved = self._conn.execute(
+                "SELECT COUNT(*), COUNT(approved) FROM products"
+            ).fetchone()
+        return {'parts': total, 'approved': approved}
@@ -0,0 +1,183 @@
+import logging
+import time
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Artifact:
+    """Something held for a job, with the callback that frees it"""
+
+    def __init__(self, kind: str, name: str, size: int, release: Callable[[], Any],
+                 job_id: Optional[Hashable], ttl: float, shared_key: Optional[Hashable] = None):
+        self.kind = kind
+        self.name = name
+        self.size = size
+        self.release = release
+        self.job_id = job_id
+        self.ttl = ttl
+        self.shared_key = shared_key  # Artifacts with the same key share one buffer, e.g. identical uploads
+        self.created_at = time.time()
+        self.last_access = self.created_at
+
+
+class StorageManager:
+    """
+    Keeps track of every upload, upload session and finished result by job.
+    A janitor thread releases artifacts that were not used within their TTL,
+    and whenever the tracked bytes exceed quota_bytes the least recently used
+    ones are released first. Artifacts of a pinned (running) job are never
+    released by the manager. Artifacts sharing a buffer count against the quota once.
+    """
+
+    def __init__(self, quota_bytes: int, default_ttl: float = 3600, sweep_interval: float = 60):
+        self.quota_bytes = quota_bytes
+        self.default_ttl = default_ttl
+        self._lock = Lock()
+        self._artifacts: Dict[Tuple[str, str], Artifact] = {}
+        self._pins: Dict[Hashable, int] = {}
+        self._evicted = {'ttl': 0, 'quota': 0}
+
+        if sweep_interval > 0:
+            Thread(target=self._janitor_loop, args=(sweep_interval,),
+                   name="storage-janitor", daemon=True).start()
+
+    def track(self, kind: str, name: str, size: int, release: Callable[[], Any],
+              job_id: Optional[Hashable] = None, ttl: Optional[float] = None,
+              shared_key: Optional[Hashable] = None) -> None:
+        """Start tracking an artifact, releasing older ones if it pushes usage over the quota"""
+        artifact = Artifact(kind, name, size, release, job_id, self.default_ttl if ttl is None else ttl, shared_key)
+        with self._lock:
+            self._artifacts[(kind, name)] = artifact
+            evicted = self._over_quota(keep=(kind, name))
+        self._release(evicted, 'quota')
+
+    def touch(self, kind: str, name: str) -> None:
+        with self._lock:
+            artifact = self._artifacts.get((kind, name))
+            if artifact is not None:
+                artifact.last_access = time.time()
+
+    def resize(self, kind: str, name: str, size: int) -> None:
+        """Update the size of a growing artifact, such as an upload receiving chunks"""
+        with self._lock:
+            artifact = self._artifacts.get((kind, name))
+            if artifact is None:
+                return
+            artifact.size = size
+            artifact.last_access = time.time()
+            evicted = self._over_quota(keep=(kind, name))
+        self._release(evicted, 'quota')
+
+    def forget(self, kind: str, name: str) -> None:
+        """Stop tracking an artifact its owner has already freed"""
+        with self._lock:
+            self._artifacts.pop((kind, name), None)
+
+    def pin(self, job_id: Hashable) -> None:
+        with self._lock:
+            self._pins[job_id] = self._pins.get(job_id, 0) + 1
+
+    def unpin(self, job_id: Hashable) -> None:
+        with self._lock:
+            count = self._pins.get(job_id, 0) - 1
+            if count > 0:
+                self._pins[job_id] = count
+            else:
+                self._pins.pop(job_id, None)
+            # Touch the job's artifacts so their TTL counts from the end of the job
+            now = time.time()
+            for artifact in self._artifacts.values():
+                if artifact.job_id == job_id:
+                    artifact.last_access = now
+
+    def _is_pinned(self, artifact: Artifact) -> bool:
+        return artifact.job_id is not None and artifact.job_id in self._pins
+
+    def _used(self) -> int:
+        """Tracked bytes, each shared buffer counted once; caller holds the lock"""
+        shared = {}
+        used = 0
+        for artifact in self._artifacts.values():
+            if artifact.shared_key is None:
+                used += artifact.size
+            else:
+                shared[artifact.shared_key] = artifact.size
+        return used + sum(shared.values())
+
+    def _over_quota(self, keep: Tuple[str, str]) -> List[Artifact]:
+        """Remove least recently used artifacts until usage fits the quota; caller holds the lock"""
+        used = self._used()
+        if used <= self.quota_bytes:
+            return []
+        evicted = []
+        candidates = sorted(
+            (a for key, a in self._artifacts.items() if key != keep and not self._is_pinned(a)),
+            key=lambda a: a.last_access
+        )
+        for artifact in candidates:
+            if used <= self.quota_bytes:
+                break
+            del self._artifacts[(artifact.kind, artifact.name)]
+            # Releasing one user of a shared buffer frees nothing until the last one goes
+            used = self._used()
+            evicted.append(artifact)
+        return evicted
+
+    def sweep(self) -> int:
+        """Release every unpinned artifact whose TTL has run out"""
+        now = time.time()
+        with self._lock:
+            expired = [a for a in self._artifacts.values()
+                       if not self._is_pinned(a) and now - a.last_access > a.ttl]
+            for artifact in expired:
+                del self._artifacts[(artifact.kind, artifact.name)]
+        self._release(expired, 'ttl')
+        return len(expired)
+
+    def _release(self, artifacts: List[Artifact], reason: str) -> None:
+        for artifact in artifacts:
+            try:
+                artifact.release()
+            except Exception as e:
+                logger.warning(f"Releasing {artifact.kind} {artifact.name} failed: {str(e)}")
+            logger.info(f"Released {artifact.kind} {artifact.name} ({artifact.size} bytes, {reason})")
+        if artifacts:
+            with self._lock:
+                self._evicted[reason] += len(artifacts)
+
+    def _janitor_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {str(e)}")
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            by_kind: Dict[str, Dict[str, int]] = {}
+            by_job: Dict[str, Dict[str, Any]] = {}
+            for artifact in self._artifacts.values():
+                kind = by_kind.setdefault(artifact.kind, {'artifacts': 0, 'bytes': 0})
+                kind['artifacts'] += 1
+                kind['bytes'] += artifact.size
+                if artifact.job_id is not None:
+                    job = by_job.setdefault(str(artifact.job_id), {
+                        'artifacts': 0, 'bytes': 0, 'pinned': artifact.job_id in self._pins
+                    })
+                    job['artifacts'] += 1
+                    job['bytes'] += artifact.size
+            return {
+                'bytes': self._used(),
+                'quota_bytes': self.quota_bytes,
+                'artifacts': len(self._artifacts),
+                'by_kind': by_kind,
+                'by_job': by_job,
+                'evicted': dict(self._evicted)
+            }
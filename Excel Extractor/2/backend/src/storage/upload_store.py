@@ -0,0 +1,101 @@
+import io
+import hashlib
+import logging
+import time
+from threading import Lock
+from typing import Any, Dict, Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Upload:
+    """One uploaded workbook held in memory"""
+
+    def __init__(self, upload_id: str, filename: str, data: bytes, fingerprint: str,
+                 owner: Optional[str] = None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.data = data
+        self.fingerprint = fingerprint
+        self.owner = owner
+        self.created_at = time.time()
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def open(self) -> io.BytesIO:
+        """A fresh file-like view of the bytes for parsers that read and seek"""
+        return io.BytesIO(self.data)
+
+
+class UploadStore:
+    """
+    Uploaded workbooks kept in memory by upload ID instead of in temp files.
+    Each upload is fingerprinted once with SHA-256; uploads of the same bytes
+    share a single buffer.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._uploads: Dict[str, Upload] = {}
+        self._buffers: Dict[str, bytes] = {}  # One buffer per fingerprint
+        self._refs: Dict[str, int] = {}
+
+    def put(self, upload_id: str, filename: str, data: bytes, fingerprint: Optional[str] = None,
+            owner: Optional[str] = None) -> Upload:
+        """Store the bytes of an upload; fingerprint may be passed when the SHA-256 is already known"""
+        fingerprint = fingerprint or hashlib.sha256(data).hexdigest()
+        with self._lock:
+            data = self._buffers.setdefault(fingerprint, data)
+            self._refs[fingerprint] = self._refs.get(fingerprint, 0) + 1
+            upload = Upload(upload_id, filename, data, fingerprint, owner)
+            self._uploads[upload_id] = upload
+        logger.info(f"Stored upload {upload_id} ({len(data)} bytes, {fingerprint[:12]})")
+        return upload
+
+    def link(self, upload_id: str, filename: str, fingerprint: str, owner: str) -> Optional[Upload]:
+        """
+        New upload sharing the buffer of identical bytes the same owner already stored,
+        or None if there is none. A client-sent fingerprint proves nothing about
+        possession of the bytes, so other owners' uploads are never linked.
+        """
+        fingerprint = fingerprint.lower()
+        with self._lock:
+            data = self._buffers.get(fingerprint)
+            if data is None or not any(
+                upload.fingerprint == fingerprint and upload.owner == owner for upload in self._uploads.values()
+            ):
+                return None
+            self._refs[fingerprint] += 1
+            upload = Upload(upload_id, filename, data, fingerprint, owner)
+            self._uploads[upload_id] = upload
+        logger.info(f"Linked upload {upload_id} to stored content {fingerprint[:12]}")
+        return upload
+
+    def get(self, upload_id: str) -> Optional[Upload]:
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def remove(self, upload_id: str) -> bool:
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+            if upload is None:
+                return False
+            self._refs[upload.fingerprint] -= 1
+            if not self._refs[upload.fingerprint]:
+                del self._refs[upload.fingerprint]
+                del self._buffers[upload.fingerprint]
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'uploads': len(self._uploads),
+                'buffers': len(self._buffers),
+                'bytes': sum(len(data) for data in self._buffers.values())
+            }
@@ -0,0 +1,32 @@
+"""
+Boilerplate stripping of DescriptionCleaner with the default rules.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.preprocess.description_cleaner import DescriptionCleaner
+
+
+class ReferenceListTest(unittest.TestCase):
+    def setUp(self):
+        self.cleaner = DescriptionCleaner.from_file(None)
+
+    def test_word_before_marked_list_is_kept(self):
+        self.assertEqual(self.cleaner.clean('GATE VALVE 2" 150# CS REF: 123, 456'), 'GATE VALVE 2" 150# CS')
+
+    def test_word_before_unmarked_list_is_kept(self):
+        self.assertEqual(
+            self.cleaner.clean('BALL VALVE 1" SS 31245-01, 31245-02 AND 31245-07'), 'BALL VALVE 1" SS'
+        )
+
+    def test_single_part_number_is_kept(self):
+        self.assertEqual(self.cleaner.clean('PUMP 31245-01 5 HP'), 'PUMP 31245-01 5 HP')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+Dry-run sampling on the shared RowScheduler when the dry run is stopped mid-sample.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.jobs.estimator import time_sample
+from src.jobs.extraction import RowTask
+from src.jobs.scheduler import RowScheduler
+
+
+class StoppedSampleTest(unittest.TestCase):
+    def test_rows_timed_before_the_stop_are_kept(self):
+        scheduler = RowScheduler(num_workers=1)
+        scheduler.register_job('dry', 3)
+        sample = [RowTask({'excel_row': idx, 'description': f'Gate valve {idx} in'}) for idx in range(3)]
+
+        def extract(task, row_metrics):
+            # The user stops the dry run while the first row is being extracted
+            scheduler.cancel_job('dry')
+            task.resolve({'Product Type': 'Gate Valve'})
+
+        sampled = time_sample(sample, extract, lambda fn: scheduler.submit('dry', fn))
+
+        self.assertEqual([row.task for row in sampled], sample[:1])
+        self.assertFalse(sampled[0].failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
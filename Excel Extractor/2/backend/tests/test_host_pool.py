@@ -0,0 +1,142 @@
+"""
+Routing and draining of HostPool against fake Ollama servers on localhost.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.host_pool import HostPool
+from src.ai.inference_backend import OllamaBackend
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/tags and streams a short /api/chat reply, or fails with 500 when told to"""
+
+    def log_message(self, *args):
+        pass
+
+    def _fail(self):
+        self.send_response(500)
+        self.end_headers()
+
+    def do_GET(self):
+        if self.server.failing:
+            return self._fail()
+        body = json.dumps({'models': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.chats += 1
+        if self.server.failing:
+            return self._fail()
+        time.sleep(self.server.delay)
+        lines = [
+            {'message': {'content': '{}'}, 'done': False},
+            {'message': {'content': ''}, 'done': True, 'prompt_eval_count': 10, 'eval_count': 2}
+        ]
+        body = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_fake_host(delay: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    server.failing = False
+    server.delay = delay
+    server.chats = 0
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class HostPoolTest(unittest.TestCase):
+
+    def start_pool(self, count: int, delay: float = 0.0, failure_threshold: int = 3):
+        self.servers = [start_fake_host(delay) for _ in range(count)]
+        for server in self.servers:
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+        backend = OllamaBackend(host_pool=None, timeout=10)
+        urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in self.servers]
+        # No background health loop, the tests run check_health themselves
+        backend.host_pool = HostPool(urls, health_check=backend.health_check, health_interval=0,
+                                     failure_threshold=failure_threshold)
+        return backend
+
+    def chat(self, backend):
+        return backend.chat('test-model', [{'role': 'user', 'content': 'hi'}])
+
+    def test_concurrent_requests_spread_by_outstanding(self):
+        backend = self.start_pool(3, delay=0.3)
+        with ThreadPoolExecutor(max_workers=9) as executor:
+            results = list(executor.map(lambda _: self.chat(backend), range(9)))
+
+        self.assertEqual(len(results), 9)
+        self.assertEqual([server.chats for server in self.servers], [3, 3, 3])
+        stats = backend.host_pool.stats()
+        self.assertTrue(all(host['outstanding'] == 0 and host['requests'] == 3 for host in stats.values()))
+
+    def test_failing_host_is_drained_and_recovers(self):
+        backend = self.start_pool(2, failure_threshold=2)
+        pool = backend.host_pool
+        bad, good = self.servers
+        bad_url = pool.urls[0]
+        bad.failing = True
+
+        failures = 0
+        for _ in range(8):
+            try:
+                self.chat(backend)
+            except Exception:
+                failures += 1
+
+        # The failing host is picked until it reaches the threshold, then gets nothing
+        self.assertEqual(failures, 2)
+        self.assertEqual(bad.chats, 2)
+        self.assertEqual(good.chats, 6)
+        self.assertFalse(pool.stats()[bad_url]['healthy'])
+
+        # Still down at the next health check
+        pool.check_health()
+        self.assertFalse(pool.stats()[bad_url]['healthy'])
+
+        bad.failing = False
+        pool.check_health()
+        self.assertTrue(pool.stats()[bad_url]['healthy'])
+        for _ in range(4):
+            self.chat(backend)
+        self.assertGreater(bad.chats, 2)
+
+    def test_all_hosts_down_still_routes(self):
+        backend = self.start_pool(2, failure_threshold=1)
+        for server in self.servers:
+            server.failing = True
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.chat(backend)
+        self.assertFalse(any(host['healthy'] for host in backend.host_pool.stats().values()))
+
+        # With every host drained the pool keeps trying instead of refusing the row
+        for server in self.servers:
+            server.failing = False
+        self.assertEqual(self.chat(backend).content, '{}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Coalesced rows of two jobs on the shared RowScheduler when the leading row's job is stopped.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import CancelledError
+from threading import Event, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cache.singleflight import SingleFlight
+from src.jobs.scheduler import RowScheduler
+from src.pipeline.pipeline import Pipeline, Stage
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class CancelledLeaderTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RowScheduler(num_workers=1)
+        for job_id in ('blocker', 'A', 'B'):
+            self.scheduler.register_job(job_id, 1)
+        # Keep the only worker busy so job A's row stays queued
+        self.release = Event()
+        self.scheduler.submit('blocker', self.release.wait)
+        wait_until(lambda: self.scheduler.stats()['busy_workers'] == 1)
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_waiter_of_another_job_runs_the_row_itself(self):
+        in_flight = SingleFlight(poll_interval=0.05)
+        results = {}
+
+        def run(job_id):
+            try:
+                results[job_id] = in_flight.do(
+                    'same description', lambda: self.scheduler.submit(job_id, lambda: job_id).result()
+                )
+            except BaseException as e:
+                results[job_id] = e
+
+        leader = Thread(target=run, args=('A',))
+        leader.start()
+        wait_until(lambda: self.scheduler.stats()['jobs']['A']['queued_rows'] == 1)
+        waiter = Thread(target=run, args=('B',))
+        waiter.start()
+        wait_until(lambda: in_flight.stats()['coalesced_calls'] == 1)
+
+        self.scheduler.cancel_job('A')
+        self.release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertIsInstance(results['A'], CancelledError)
+        self.assertEqual(results['B'], ('B', False))
+
+    def test_pipeline_counts_unrequested_cancellation_as_error(self):
+        def cancelled(item):
+            raise CancelledError()
+
+        pipeline = Pipeline([Stage('llm', cancelled)])
+        pipeline.run([1, 2])
+        stats = pipeline.stats()['stages']['llm']
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['dropped'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,14 @@ function App() {
   const [isPreparingDownload, setIsPreparingDownload] = useState(false);
   // State to store the path to the processed file on the server
   const [processedFilePath, setProcessedFilePath] = useState(null);
+  // State to store the most recently extracted rows streamed from the server
+  const [liveRows, setLiveRows] = useState([]);
+  // State to store the first rows and suggested start cells of the selected sheet
+  const [preview, setPreview] = useState(null);
+  // State to store the projected duration and tokens from a dry run
+  const [estimate, setEstimate] = useState(null);
+  // State to track if a dry run is in progress
+  const [isEstimating, setIsEstimating] = useState(false);
 
 
   // Handler for file drop functionality using react-dropzone
@@ -46,6 +54,10 @@ function App() {
       // Send request to server to stop processing
       const response = await fetch('/api/stop', {
         method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ job_id: uploadId }),
       });
   
       console.log('Stop response status:', response.status);
@@ -94,7 +106,7 @@ function App() {
             headers: {
               'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ filePath: processedFilePath }),
+            body: JSON.stringify({ filePath: processedFilePath, job_id: uploadId }),
           });
   
           if (response.ok) {
@@ -141,10 +153,34 @@ function App() {
     }
   };
 
+  // Handler to download the rows completed so far while processing continues
+  const handleSnapshot = async () => {
+    try {
+      const response = await fetch(`/api/jobs/${uploadId}/snapshot?format=xlsx`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      // Create a download link for the partial results
+      const blob = await response.blob();
+      const url = window.URL.createObjectURL(blob);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = 'partial_results.xlsx';
+      document.body.appendChild(a);
+      a.click();
+      window.URL.revokeObjectURL(url);
+      document.body.removeChild(a);
+    } catch (error) {
+      console.error('Snapshot download failed:', error);
+      alert('Failed to download partial results. Please try again.');
+    }
+  };
+
 
   // Set up Server-Sent Events for real-time progress updates
   const startProgressMonitoring = () => {
-    const eventSource = new EventSource('/api/progress');
+    const eventSource = new EventSource(`/api/progress?job_id=${uploadId}`);
     
     // Update progress state when new events are received
     eventSource.onmessage = (event) => {
@@ -156,6 +192,58 @@ function App() {
   };
 
 
+  // Stream extracted rows as NDJSON, resuming from the last offset if the connection drops
+  const startRowStreaming = (jobId) => {
+    const controller = new AbortController();
+    let offset = 0;
+
+    const readStream = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const response = await fetch(`/api/jobs/${jobId}/rows?offset=${offset}`, {
+            signal: controller.signal,
+          });
+          if (!response.ok) {
+            // The job may not be registered yet, try again shortly
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            continue;
+          }
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+              if (!line.trim()) continue;
+              const message = JSON.parse(line);
+              if (message.event === 'row') {
+                offset = message.offset + 1;
+                setLiveRows(rows => [message.row, ...rows].slice(0, 10));
+              } else if (message.event === 'end') {
+                return;
+              }
+            }
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('Row stream interrupted, reconnecting:', error);
+          await new Promise(resolve => setTimeout(resolve, 2000));
+        }
+      }
+    };
+
+    readStream();
+    return controller;
+  };
+
+
   // Configure react-dropzone for file uploads
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
@@ -165,42 +253,95 @@ function App() {
     multiple: false
   })
 
-  // Handler to upload the selected Excel file
-  const handleUpload = async () => {
-    if (!file) return
-
-    // Create form data with the file for uploading
-    const formData = new FormData()
-    formData.append('file', file)
+  // SHA-256 of a blob as hex, or null where the browser has no WebCrypto (plain http)
+  const sha256Hex = async (blob) => {
+    if (!window.crypto?.subtle) return null
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer())
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+  }
 
-    try {
-      console.log('Uploading file:', file)
-      console.log('Sending request to /api/upload')
+  // Send the file in chunks, resuming an upload of the same file that was cut off
+  const uploadInChunks = async (file) => {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`
+    let status = null
 
-      // Send file to server
-      const response = await fetch('/api/upload', {
+    const savedId = localStorage.getItem(resumeKey)
+    if (savedId) {
+      const response = await fetch(`/api/uploads/${savedId}`)
+      if (response.ok) status = await response.json()
+    }
+    if (!status || status.complete) {
+      const response = await fetch('/api/uploads', {
         method: 'POST',
-        body: formData,
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, sha256: await sha256Hex(file) })
       })
+      status = await response.json()
+      if (!response.ok) throw new Error(status.error || `HTTP error! status: ${response.status}`)
+      // The server already has this content
+      if (status.complete) return status
+      localStorage.setItem(resumeKey, status.upload_id)
+    }
 
-      console.log('Response status:', response.status)
+    for (let index = status.received_chunks; index < status.total_chunks; index++) {
+      const chunk = file.slice(index * status.chunk_size, (index + 1) * status.chunk_size)
+      const headers = { 'Content-Type': 'application/octet-stream' }
+      const chunkHash = await sha256Hex(chunk)
+      if (chunkHash) headers['X-Chunk-SHA256'] = chunkHash
 
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`)
+      // Retry dropped connections and corrupted chunks a few times before giving up
+      for (let attempt = 1; ; attempt++) {
+        let response = null
+        try {
+          response = await fetch(`/api/uploads/${status.upload_id}/chunks/${index}`, {
+            method: 'PUT', headers, body: chunk
+          })
+        } catch (error) {
+          if (attempt >= 3) throw error
+        }
+        if (response?.ok) break
+        if (response && ((response.status !== 422 && response.status < 500) || attempt >= 3)) {
+          const data = await response.json().catch(() => ({}))
+          throw new Error(data.error || `HTTP error! status: ${response.status}`)
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * attempt))
       }
+      console.log(`Uploaded chunk ${index + 1}/${status.total_chunks}`)
+    }
 
-      // Process server response
-      const data = await response.json()
+    const response = await fetch(`/api/uploads/${status.upload_id}/complete`, { method: 'POST' })
+    const data = await response.json()
+    if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`)
+    localStorage.removeItem(resumeKey)
+    return data
+  }
+
+  // Load the first rows of a sheet and the start cells suggested from its headers
+  const loadPreview = async (id, sheetName) => {
+    try {
+      const params = new URLSearchParams({ sheet_name: sheetName, rows: 10 })
+      const response = await fetch(`/api/uploads/${id}/preview?${params}`)
+      setPreview(response.ok ? await response.json() : null)
+    } catch (error) {
+      console.error('Preview failed:', error)
+      setPreview(null)
+    }
+  }
+
+  // Handler to upload the selected Excel file
+  const handleUpload = async () => {
+    if (!file) return
+
+    try {
+      console.log('Uploading file:', file)
+      const data = await uploadInChunks(file)
       console.log('Upload response:', data)
-      
-      if (data.error) {
-        throw new Error(data.error)
-      }
 
       // Update state with upload results and move to next step
       setUploadId(data.upload_id)
       setSheetNames(data.sheet_names)
       setCurrentStep('sheet')
+      if (data.sheet_names.length) loadPreview(data.upload_id, data.sheet_names[0])
       
     } catch (error) {
       console.error('Upload failed:', error)
@@ -208,6 +349,40 @@ function App() {
     }
   }
 
+  // Handler to time a sample of the rows and project the duration of the full run
+  const handleEstimate = async () => {
+    const sheetName = document.getElementById('sheetSelect').value
+    const partCell = document.getElementById('partCell').value
+    const descCell = document.getElementById('descCell').value
+    const vendorCell = document.getElementById('vendorCell').value
+    if (!sheetName || !partCell || !descCell || !vendorCell) {
+      alert('Please fill in all fields')
+      return
+    }
+
+    const formData = new FormData()
+    formData.append('upload_id', uploadId)
+    formData.append('sheet_name', sheetName)
+    formData.append('part_cell', partCell)
+    formData.append('desc_cell', descCell)
+    formData.append('vendor_cell', vendorCell)
+    formData.append('dry_run', '1')
+
+    try {
+      setIsEstimating(true)
+      setEstimate(null)
+      const response = await fetch('/api/process', { method: 'POST', body: formData })
+      const data = await response.json()
+      if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`)
+      setEstimate(data)
+    } catch (error) {
+      console.error('Estimate failed:', error)
+      alert(`Failed to estimate: ${error.message}`)
+    } finally {
+      setIsEstimating(false)
+    }
+  }
+
   // Handler to process the uploaded Excel file with the selected options
   const handleProcess = async () => {
     try {
@@ -218,6 +393,8 @@ function App() {
       
       // Start progress monitoring
       const eventSource = startProgressMonitoring();
+      setLiveRows([])
+      const rowStream = startRowStreaming(uploadId);
       
       // Get configuration values from form inputs
       const sheetName = document.getElementById('sheetSelect').value
@@ -253,6 +430,12 @@ function App() {
   
       console.log('Process response status:', response.status);
   
+      if (response.status === 429) {
+        // The server is saturated, tell the user when to try again
+        const errorData = await response.json();
+        throw new Error(`${errorData.error}. Please try again in ${response.headers.get('Retry-After')} seconds.`);
+      }
+
       if (!response.ok) {
         const errorData = await response.text();
         console.error('Process error response:', errorData);
@@ -261,6 +444,7 @@ function App() {
   
       // Close progress monitoring
       eventSource.close();
+      rowStream.abort();
   
       setProcessingStatus('generating')
   
@@ -394,6 +578,7 @@ function App() {
                     <select 
                       id="sheetSelect"
                       className="select select-bordered w-full"
+                      onChange={(e) => loadPreview(uploadId, e.target.value)}
                     >
                       {sheetNames.map((sheet, index) => (
                         <option key={index} value={sheet}>{sheet}</option>
@@ -401,6 +586,30 @@ function App() {
                     </select>
                   </div>
 
+                  {/* First rows of the selected sheet to help pick the start cells */}
+                  {preview && preview.rows.length > 0 && (
+                    <div className="overflow-x-auto max-h-64 border rounded-lg">
+                      <table className="table table-xs table-pin-rows">
+                        <thead>
+                          <tr>
+                            <th></th>
+                            {preview.columns.map(column => <th key={column}>{column}</th>)}
+                          </tr>
+                        </thead>
+                        <tbody>
+                          {preview.rows.map(row => (
+                            <tr key={row.row}>
+                              <th>{row.row}</th>
+                              {row.values.map((value, index) => (
+                                <td key={index} className="max-w-xs truncate">{value}</td>
+                              ))}
+                            </tr>
+                          ))}
+                        </tbody>
+                      </table>
+                    </div>
+                  )}
+
                   {/* Part number cell input - user specifies the starting cell */}
                   <div className="form-control">
                     <label className="label">
@@ -409,6 +618,8 @@ function App() {
                     </label>
                     <input 
                       id="partCell"
+                      key={`part-${preview?.sheet_name}`}
+                      defaultValue={preview?.suggested?.part_cell || ''}
                       type="text" 
                       className="input input-bordered"
                       placeholder="Enter part number header cell"
@@ -424,6 +635,8 @@ function App() {
                     </label>
                     <input 
                       id="descCell"
+                      key={`desc-${preview?.sheet_name}`}
+                      defaultValue={preview?.suggested?.desc_cell || ''}
                       type="text" 
                       className="input input-bordered"
                       placeholder="Enter description header cell"
@@ -439,6 +652,8 @@ function App() {
                     </label>
                     <input 
                       id="vendorCell"
+                      key={`vendor-${preview?.sheet_name}`}
+                      defaultValue={preview?.suggested?.vendor_cell || ''}
                       type="text" 
                       className="input input-bordered"
                       placeholder="Enter vendor header cell"
@@ -446,11 +661,37 @@ function App() {
                     />
                   </div>
 
+                  {/* Estimate button - times a sample of the rows before committing to the run */}
+                  <button
+                    className="btn btn-outline w-full"
+                    onClick={handleEstimate}
+                    disabled={isProcessing || isEstimating}
+                  >
+                    {isEstimating ? (
+                      <>
+                        <span className="loading loading-spinner"></span>
+                        Estimating...
+                      </>
+                    ) : (
+                      'Estimate Time'
+                    )}
+                  </button>
+
+                  {estimate && (
+                    <div className="alert">
+                      <span>
+                        About {estimate.projection.minutes} minutes and {estimate.projection.tokens.toLocaleString()} tokens
+                        for {estimate.projection.model_rows} of {estimate.rows.total} rows
+                        ({estimate.sample.rows} rows sampled, {estimate.sample.avg_latency_seconds}s per row)
+                      </span>
+                    </div>
+                  )}
+
                   {/* Process button - begins processing with selected configuration */}
                   <button 
                     className="btn btn-primary w-full"
                     onClick={handleProcess}
-                    disabled={isProcessing}
+                    disabled={isProcessing || isEstimating}
                   >
                     {isProcessing ? (
                       <>
@@ -492,7 +733,10 @@ function App() {
 
                   {/* Progress Text - Numerical representation of processing progress */}
                   <div className="text-sm text-base-content/70 mb-6">
-                    {progress.total > 0 && (
+                    {progress.queue_position > 0 && (
+                      <p>Waiting in queue (position {progress.queue_position})</p>
+                    )}
+                    {progress.total > 0 && !progress.queue_position && (
                       <p>
                         Processing row {progress.current} of {progress.total}
                         {' '}
@@ -501,6 +745,32 @@ function App() {
                     )}
                   </div>
 
+                  {/* Live Rows - Most recent rows extracted by the server */}
+                  {liveRows.length > 0 && (
+                    <div className="w-full mb-6 overflow-x-auto">
+                      <table className="table table-xs">
+                        <thead>
+                          <tr>
+                            <th>Row</th>
+                            <th>Part Number</th>
+                            <th>Product Type</th>
+                            <th>Size</th>
+                          </tr>
+                        </thead>
+                        <tbody>
+                          {liveRows.map(row => (
+                            <tr key={row.excel_row}>
+                              <td>{row.excel_row}</td>
+                              <td>{row.part_number}</td>
+                              <td>{row['Product Type']}</td>
+                              <td>{row.Size}</td>
+                            </tr>
+                          ))}
+                        </tbody>
+                      </table>
+                    </div>
+                  )}
+
                   {/* Processing Steps - Shows the different phases of processing */}
                   <div className="text-left text-sm text-base-content/60 w-full mb-8">
                     <p className={processingStatus === 'extracting' ? 'text-primary' : ''}>
@@ -535,6 +805,14 @@ function App() {
                         'Stop & Save'
                       )}
                     </button>
+                    {/* Snapshot button - downloads completed rows without stopping */}
+                    <button 
+                      className="btn btn-secondary flex-1"
+                      onClick={handleSnapshot}
+                      disabled={!isProcessing || progress.current === 0}
+                    >
+                      Snapshot
+                    </button>
                     {/* Download button - gets the processed file when available */}
                     <button 
                       className="btn btn-primary flex-1"